@@ -1,20 +1,80 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from functools import wraps
+from array import array
+import multiprocessing
+import threading
 import random
+import struct
+import sys
+import os
 
 app = Flask(__name__)
+STANDARD_NORMAL = NormalDist()
+CONTENT_TYPE = 'application/x-var9599'
+SAMPLING = ('pseudo', 'antithetic', 'sobol', 'stratified')
+HEADER = struct.Struct('<IIB')
+
+# simulations run in a pool of processes sized to the cores of the instance,
+# or in the server worker itself when SIM_PROCESSES is 0 (pre-fork mode)
+PROCESSES = int(os.getenv('SIM_PROCESSES', os.cpu_count() or 1))
+MAX_PENDING = int(os.getenv('MAX_PENDING', max(PROCESSES, 1) * 4))
+pool = None
+pool_lock = threading.Lock()
+pending = 0
+pending_lock = threading.Lock()
+
+
+def limited(route):
+    """
+    Admits at most MAX_PENDING simulation requests at once, the others are
+    turned away with a 503 so that the caller retries rather than queuing
+    more work than the cores can get through.
+    """
+    @wraps(route)
+    def admitted(*args, **kwargs):
+        global pending
+        with pending_lock:
+            if pending >= MAX_PENDING:
+                return jsonify({'error': 'busy'}), 503, {'Retry-After': '1'}
+            pending += 1
+        try:
+            return route(*args, **kwargs)
+        finally:
+            with pending_lock:
+                pending -= 1
+    return admitted
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({
+        'status': 'ok',
+        'processes': PROCESSES,
+        'pending': pending,
+        'capacity': MAX_PENDING,
+    })
 
 
 @app.route('/calculate_var9599', methods=['POST'])
+@limited
 def calculate_var():
+    # simulations packed in the binary wire format are answered in it
+    if request.content_type == CONTENT_TYPE:
+        means, stds, shots, sampling = decode_request(request.get_data())
+        var95, var99 = run_batch(means, stds, shots, sampling)
+        return Response(encode_response(var95, var99), content_type=CONTENT_TYPE)
+
     data = request.json
-    mean = float(data['mean'])
-    std = float(data['std'])
     shots = int(data['shots'])
+    sampling = data.get('sampling', 'pseudo')
     
-    simulated = [random.gauss(mean, std) for x in range(shots)]
-    simulated.sort(reverse=True)
-    var95 = simulated[int(len(simulated) * 0.95)]
-    var99 = simulated[int(len(simulated) * 0.99)]
+    # a batch of simulations is sent as lists of means and stds
+    if isinstance(data['mean'], list):
+        var95, var99 = run_batch(data['mean'], data['std'], shots, sampling)
+    else:
+        var95, var99 = submit(simulate, float(data['mean']), float(data['std']), shots, sampling)()
     
     var = {
         'var95': var95,
@@ -24,5 +84,116 @@ def calculate_var():
     return jsonify(var)
 
 
+def submit(function, *args):
+    """
+    Submits a CPU-bound function to the pool of processes, created on first
+    use so that it belongs to the server worker process using it, and returns
+    a callable waiting for its result. Without a pool the function runs in
+    the server worker straight away. The server worker already runs threads
+    by then, so the processes are started from a fork server rather than
+    forked from it, which could deadlock.
+    """
+    global pool
+    if PROCESSES == 0:
+        result = function(*args)
+        return lambda: result
+    with pool_lock:
+        if pool is None:
+            pool = ProcessPoolExecutor(
+                max_workers=PROCESSES, mp_context=multiprocessing.get_context('forkserver')
+            )
+    return pool.submit(function, *args).result
+
+
+def run_batch(means: list, stds: list, shots: int, sampling: str) -> tuple:
+    """
+    Splits a batch of simulations evenly across the processes of the pool.
+    """
+    size = max(-(-len(means) // max(PROCESSES, 1)), 1)
+    chunks = [
+        submit(simulate_batch, means[i:i + size], stds[i:i + size], shots, sampling)
+        for i in range(0, len(means), size)
+    ]
+    var95, var99 = [], []
+    for chunk in chunks:
+        chunk_var95, chunk_var99 = chunk()
+        var95 += chunk_var95
+        var99 += chunk_var99
+    return var95, var99
+
+
+def simulate_batch(means: list, stds: list, shots: int, sampling: str='pseudo') -> tuple:
+    results = [
+        simulate(float(mean), float(std), shots, sampling) 
+        for mean, std in zip(means, stds)
+    ]
+    var95 = [result[0] for result in results]
+    var99 = [result[1] for result in results]
+    return var95, var99
+
+
+def decode_request(body: bytes) -> tuple:
+    """
+    Binary requests pack, little-endian, the number of shots (uint32), the
+    number of simulations n (uint32) and the index of the sampling strategy
+    (uint8), followed by the n means and the n stds as float64.
+    """
+    shots, count, sampling = HEADER.unpack_from(body)
+    values = array('d')
+    values.frombytes(body[HEADER.size:])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values[:count], values[count:], shots, SAMPLING[sampling]
+
+
+def encode_response(var95: list, var99: list) -> bytes:
+    """
+    Binary responses hold the n var95 followed by the n var99 as float64.
+    """
+    values = array('d', var95 + var99)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def simulate(mean: float, std: float, shots: int, sampling: str='pseudo') -> tuple:
+    simulated = draw(mean, std, shots, sampling)
+    simulated.sort(reverse=True)
+    var95 = simulated[int(len(simulated) * 0.95)]
+    var99 = simulated[int(len(simulated) * 0.99)]
+    return var95, var99
+
+
+def draw(mean: float, std: float, shots: int, sampling: str='pseudo') -> list:
+    """
+    Draws normal shots with the sampling strategy requested. Antithetic
+    variates pair every draw with its mirror, sobol uses the first Sobol
+    dimension (the base 2 van der Corput sequence) randomly shifted, and
+    stratified draws one uniform in each of the shots equal strata. The
+    last two are mapped to normals through the inverse normal cdf.
+    """
+    if sampling == 'antithetic':
+        half = [random.gauss(0, 1) for x in range((shots + 1) // 2)]
+        normals = (half + [-z for z in half])[:shots]
+    elif sampling == 'sobol':
+        shift = random.random()
+        normals = [inverse_normal((van_der_corput(x + 1) + shift) % 1) for x in range(shots)]
+    elif sampling == 'stratified':
+        normals = [inverse_normal((x + random.random()) / shots) for x in range(shots)]
+    else:
+        return [random.gauss(mean, std) for x in range(shots)]
+    return [mean + std * z for z in normals]
+
+
+def van_der_corput(n: int) -> float:
+    # base 2 radical inverse, the bits of n mirrored around the binary point
+    return int(format(n, '032b')[::-1], 2) / 2 ** 32
+
+
+def inverse_normal(u: float) -> float:
+    # uniforms of exactly 0 or 1 have no finite normal
+    return STANDARD_NORMAL.inv_cdf(min(max(u, 1e-12), 1 - 1e-12))
+
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,16 @@
+import os
+
+# Gunicorn settings of the EC2 instances. By default a single pre-forked worker
+# serves requests on threads while simulations run in its pool of processes
+# sized to the cores (see app.py). For a pure pre-fork mode, set WEB_WORKERS to
+# the number of cores and SIM_PROCESSES to 0 so that each worker simulates.
+bind = os.getenv('BIND', ':5000')
+workers = int(os.getenv('WEB_WORKERS', 1))
+worker_class = 'gthread'
+# twice as many threads as requests admitted by the app (MAX_PENDING, worked
+# out as in app.py) so that the excess is answered with a 503 rather than queued
+processes = int(os.getenv('SIM_PROCESSES', os.cpu_count() or 1))
+max_pending = int(os.getenv('MAX_PENDING', max(processes, 1) * 4))
+threads = int(os.getenv('WEB_THREADS', 2 * max_pending))
+timeout = 600
+keepalive = 5
@@ -0,0 +1,103 @@
+import numpy as np
+
+from typing import Callable
+from functools import cache
+
+
+class Advisor:
+    """
+    Fits latency and cost models to the history of analyses kept in the
+    S3 audit so that the service and scale of an analysis can be chosen
+    from data rather than guessed. One model of each is fitted per service.
+    """
+    SERVICES = ("lambda", "ec2")
+    FEATURES = 5
+
+    def __init__(self, audit: list[dict], count_signals: Callable[[int, str], int]):
+        """
+        Constructor fits the models of every service with at least as many
+        runs in the audit as the models have features, along with the range
+        of scales those runs cover. Runs recorded before the number of
+        signals was stored have it counted again from their lookback and
+        trade type.
+        """
+        self.count_signals = cache(count_signals)
+        self.models = {}
+        self.scales = {}
+        runs = [run for run in audit or [] if run.get("s") in self.SERVICES]
+        for service in self.SERVICES:
+            history = [run for run in runs if run["s"] == service]
+            if len(history) >= self.FEATURES:
+                self.models[service] = self._fit(history)
+                scales = [int(run["r"]) for run in history]
+                self.scales[service] = range(min(scales), max(scales) + 1)
+
+    def recommend(self, h: int, d: int, t: str, p: int,
+                  latency: float | None=None, budget: float | None=None) -> dict:
+        """
+        Predicts the latency (ms) and cost of the analysis for every service
+        and scale within the scales already run, since the models can't be
+        trusted beyond them. Among the configurations meeting the targets,
+        the fastest is picked when only a budget is given and the cheapest
+        otherwise. When no configuration meets the targets the fastest or
+        cheapest one is returned with its feasibility set to false. The
+        holding period doesn't change the simulations so it isn't modelled.
+        """
+        if not self.models:
+            return {"result": "insufficient audit history"}
+        signals = self.count_signals(h, t)
+        candidates = []
+        for service, (time_model, cost_model) in self.models.items():
+            for r in self.scales[service]:
+                features = self._features(signals, d, r)
+                candidates.append({
+                    "s": service,
+                    "r": r,
+                    "time": max(float(features @ time_model), 0.0),
+                    "cost": max(float(features @ cost_model), 0.0),
+                })
+
+        feasible = [
+            candidate for candidate in candidates
+            if (latency is None or candidate["time"] <= latency)
+            and (budget is None or candidate["cost"] <= budget)
+        ]
+        if feasible and budget is not None and latency is None:
+            best = min(feasible, key=lambda candidate: (candidate["time"], candidate["cost"]))
+        elif feasible:
+            best = min(feasible, key=lambda candidate: (candidate["cost"], candidate["time"]))
+        elif latency is not None:
+            best = min(candidates, key=lambda candidate: candidate["time"])
+        else:
+            best = min(candidates, key=lambda candidate: candidate["cost"])
+        return {**best, "signals": signals, "feasible": bool(feasible)}
+
+    def _fit(self, history: list[dict]) -> tuple:
+        """
+        Fits time and cost by least squares on the same features. Latency is
+        taken from the wall-clock time of the run when it was recorded and
+        from its billable time for older runs, which were billed on it.
+        """
+        features = np.array([
+            self._features(self._signals(run), int(run["d"]), int(run["r"]))
+            for run in history
+        ])
+        times = np.array([float(run.get("latency") or run["time"]) for run in history])
+        costs = np.array([float(run["cost"]) for run in history])
+        time_model = np.linalg.lstsq(features, times, rcond=None)[0]
+        cost_model = np.linalg.lstsq(features, costs, rcond=None)[0]
+        return time_model, cost_model
+
+    def _signals(self, run: dict) -> int:
+        if run.get("signals") is not None:
+            return int(run["signals"])
+        return self.count_signals(int(run["h"]), run["t"])
+
+    @staticmethod
+    def _features(signals: int, d: int, r: int) -> np.ndarray:
+        """
+        Each signal costs a round trip and d shots on each of the r parallel
+        calls, the slowest of which sets the pace, so both the per signal
+        and per call terms are kept for the models to weigh.
+        """
+        return np.array([1, signals, signals * d, signals * r, signals * r * d], dtype=float)
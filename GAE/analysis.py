@@ -1,46 +1,112 @@
 import os
 import json
+import math
 import time
-import http.client
-import yfinance as yf
-import pandas as pd
+import itertools
+import threading
+import numpy as np
 
-from services import Lambda, EC2
+import charts
+import local_var
+
+from services import Lambda, EC2, connect
 from costs import CostCalculator
 from datetime import date, timedelta
-from pandas_datareader import data as pdr
+from collections import deque
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
 
-yf.pdr_override()
-today = date.today()
-timePast = today - timedelta(days=1095)
 GOOGLE_DATA = 'GOOG'
-data = pdr.get_data_yahoo(GOOGLE_DATA, start=timePast, end=today) 
+PRICES_CSV = os.getenv('PRICES_CSV')
+# pandas, yfinance and the prices are only loaded on first use so that a new
+# instance answers as soon as the app is imported
+data = None
+data_lock = threading.Lock()
+
+
+def get_data() -> "pd.DataFrame":
+    """
+    Returns the prices the analyses run on, loading them on the first call.
+    Concurrent first calls wait for a single load.
+    """
+    global data
+    if data is None:
+        with data_lock:
+            if data is None:
+                data = load_data()
+    return data
+
+
+def load_data() -> "pd.DataFrame":
+    """
+    Loads the last three years of prices from Yahoo, or from PRICES_CSV when
+    they are stored locally, e.g. synthetic data used for benchmarking.
+    """
+    import pandas as pd
+
+    if PRICES_CSV:
+        return pd.read_csv(PRICES_CSV, index_col=0, parse_dates=True)
+
+    import yfinance as yf
+    from pandas_datareader import data as pdr
+
+    yf.pdr_override()
+    today = date.today()
+    timePast = today - timedelta(days=1095)
+    return pdr.get_data_yahoo(GOOGLE_DATA, start=timePast, end=today)
 
 
 class Analyser:
 
     lambda_s3_host = os.getenv('S3_URL')
+    # versions of the results, unique across the analysers of the process
+    versions = itertools.count(1)
+    # signals detected by count_signals, along with the data they were detected on
+    detected = None
 
-    def __init__(self, s: str, r: int):
+    def __init__(self, s: str, r: int, keep_warm: float | None=None):
         """
         Constructor initialises and scales a service based on the user choice.
-        The signals and data needed for the analysis are also readied.
+        The signals and data needed for the analysis are also readied. Lambda
+        containers are kept warm every keep_warm seconds when it is given.
         """
-        self.var95s = []
-        self.var99s = []
-        self.profit_loss = []
+        self.signals = np.empty(0, dtype=int)
+        self.var95s = np.empty(0)
+        self.var99s = np.empty(0)
+        self.profit_loss = np.empty(0)
+        self.summary = None
         self.time_cost = None
-        self.data = data
+        self.live = None
+        self.version = next(self.versions)
+        self.charts = {}
+        self.data = get_data()
         self.data['Buy'] = 0
         self.data['Sell'] = 0
         self.analysis_complete = False
         if s.lower() == 'lambda':
-            self.service = Lambda(runs=r)
+            self.service = Lambda(runs=r, keep_warm=keep_warm)
         elif s.lower() == 'ec2':
             self.service = EC2(runs=r)
 
-        self._detect_signals()
+        self._detect_signals(self.data)
         
+    @property
+    def data(self) -> "pd.DataFrame":
+        """
+        Prices of the analysis. Bars appended live are kept in arrays and
+        only joined to the frame when it is read, so that appending them
+        doesn't copy the history.
+        """
+        if self.live and self.live["prices"]["joined"] < self.live["prices"]["count"]:
+            self._data = self._join_bars()
+        return self._data
+
+    @data.setter
+    def data(self, frame: "pd.DataFrame") -> None:
+        self._data = frame
+
     @property
     def get_warmup_cost(self) -> dict:
         return self.service.get_warmup_cost
@@ -55,23 +121,69 @@ class Analyser:
 
     @property
     def get_var9599(self) -> dict:
-        return {'var95': self.var95s, 'var99': self.var99s}
+        return {'var95': self.var95s.tolist(), 'var99': self.var99s.tolist()}
     
     @property
     def get_profit_loss(self) -> dict:
-        return {'profit_loss': self.profit_loss}
+        return {'profit_loss': self.profit_loss.tolist()}
         
     @property
     def get_avg_var9599(self) -> dict: 
-        var95_avg = self._compute_avg(self.var95s)
-        var99_avg = self._compute_avg(self.var99s)
-        return {'var95': var95_avg, 'var99': var99_avg}
+        summary = self.get_summary
+        return {'var95': summary['avg_var95'], 'var99': summary['avg_var99']}
             
     @property
     def get_tot_profit_loss(self) -> dict: 
-        profit_loss_tot = sum(self.profit_loss)
-        return {'profit_loss': profit_loss_tot}
+        return {'profit_loss': self.get_summary['profit_loss']}
+
+    @property
+    def get_summary(self) -> dict:
+        """
+        Aggregates of the latest analysis. They are computed once over the
+        whole results and kept until the next analysis or reset.
+        """
+        if self.summary is None:
+            self.summary = self._summarise()
+        return self.summary
+
+    def get_chart_data(self, width: int, method: str='lttb') -> dict:
+        """
+        Risks downsampled to the width of a chart. They are computed once per
+        width and method and kept until the results change. Widths fitting all
+        the signals give the same risks and share a single entry.
+        """
+        width = min(width, len(self.var95s))
+        key = (width, method)
+        if key not in self.charts:
+            summary = self.get_summary
+            self.charts[key] = charts.downsample(
+                self.var95s, self.var99s, summary['avg_var95'], summary['avg_var99'], width, method
+            )
+        return self.charts[key]
         
+    @classmethod
+    def count_signals(cls, h: int, t: str) -> int:
+        """
+        Counts the buy/sell signals an analysis with the lookback specified
+        would go through. The signals are detected on a copy of the data so
+        that no instance, and therefore no service, is needed. Detection
+        doesn't depend on the lookback, so it runs once per data and every
+        count only slices its result.
+        """
+        frame = get_data()
+        if cls.detected is None or cls.detected[0] is not frame:
+            copy = frame.copy()
+            copy['Buy'] = 0
+            copy['Sell'] = 0
+            cls._detect_signals(copy)
+            cls.detected = (frame, copy.Buy.to_numpy(), copy.Sell.to_numpy())
+        _, buy, sell = cls.detected
+        if t.lower() == "sell":
+            target = sell
+        elif t.lower() == "buy":
+            target = buy
+        return int(target[h:].sum())
+
     @classmethod
     def get_audit(cls) -> dict:
         """
@@ -82,7 +194,7 @@ class Analyser:
         for managing the system's S3 bucket used for storage.
         """
         try:
-            client = http.client.HTTPSConnection(cls.lambda_s3_host)
+            client = connect(cls.lambda_s3_host)
             payload = json.dumps({
                 "action": "read", 
             })
@@ -92,56 +204,309 @@ class Analyser:
         except IOError:
             print(f'Couldn\'t connect to {cls.lambda_s3_host}') 
                     
-    def analyse_risk(self, h: int, d: int, t: str, p: int) -> None:
+    def analyse_risk(self, h: int, d: int, t: str, p: int, sampling: str='pseudo',
+                     engine: str='service') -> None:
         """
         Analyses the risks using the service specified on the object creation.
-        Higher and lower risk values are averaged before being stored. Also,
-        the method stores all the analysis information in a S3 Bucket once 
-        complete.
+        Higher and lower risk values are averaged before being stored in arrays
+        allocated for all the signals, and the profit/loss of every signal is
+        computed at once from their indices. Also, the method stores all the
+        analysis information in a S3 Bucket once complete. The historical and
+        bootstrap engines compute the risks of all the signals locally instead,
+        at no cost on AWS.
         """
         if t.lower() == "sell":
             target = self.data.Sell
         elif t.lower() == "buy":
             target = self.data.Buy
-        
+
+        close = self.data.Close.to_numpy()
+        returns = self.data.Close.pct_change(1).to_numpy()
+        self.signals = np.flatnonzero(target.to_numpy()[h:] == 1) + h
+        self.var95s = np.empty(len(self.signals))
+        self.var99s = np.empty(len(self.signals))
+        self.summary = None
+        self.live = None
+
+        self.service.reset_invocations()
         start = time.time()
-        for i in range(h, len(self.data)): 
-            if target[i]==1: # buy/sell signal 
-                mean=self.data.Close[i-h:i].pct_change(1).mean()
-                std=self.data.Close[i-h:i].pct_change(1).std()
+        if engine in local_var.ENGINES:
+            self.var95s, self.var99s = local_var.get_var9599(engine, returns, self.signals, h, d)
+        else:
+            for n, i in enumerate(self.signals): 
+                # returns of the h closes preceding the signal
+                window = returns[i-h+1:i]
+                mean = window.mean()
+                std = window.std(ddof=1)
                 var95: tuple 
                 var99: tuple
                 # performing the simulation using the service specified by the user
-                var95, var99 = self.service.get_var9599(mean, std, d)
+                var95, var99 = self.service.get_var9599(mean, std, d, sampling)
                 # averaging values and storing them
-                self.var95s.append(self._compute_avg(var95))
-                self.var99s.append(self._compute_avg(var99))
-                # computing profit/loss
-                if i + p < len(self.data): # the number of days after the signal shouldn't be out of range
-                    self.profit_loss.append(
-                        self._compute_profit_loss(
-                            trade=t.lower(),
-                            entry_price=self.data.Close[i],
-                            exit_price=self.data.Close[i+p]
-                        )
-                    )
+                self.var95s[n] = self._compute_avg(var95)
+                self.var99s[n] = self._compute_avg(var99)
+        # computing profit/loss, the number of days after the signal shouldn't be out of range
+        entries = self.signals[self.signals + p < len(close)]
+        self.profit_loss = self._compute_profit_loss(
+            trade=t.lower(),
+            entry_price=close[entries],
+            exit_price=close[entries + p]
+        )
         time_taken = time.time() - start
         self.analysis_complete = True
-        # computing costs
-        if self.service.name == "ec2":
-            self.time_cost = CostCalculator.ec2_cost(time_taken, self.service.runs)
-        elif self.service.name == "lambda":
-            self.time_cost = CostCalculator.lambda_cost(time_taken, self.service.runs)
+        self._results_changed()
+        # computing costs from the calls the service recorded, local engines cost nothing
+        if engine in local_var.ENGINES:
+            self.time_cost = {"billable_time": 0, "cost": 0.0}
+        else:
+            self.time_cost = self.service.bill_analysis(time_taken)
+        self.time_cost.update(
+            CostCalculator.unit_costs(
+                cost=self.time_cost['cost'],
+                signals=len(self.var95s),
+                shots=len(self.var95s) * d * self.service.runs,
+            )
+        )
         # storing results
         self._save_results_s3(
+            s=engine if engine in local_var.ENGINES else self.service.name,
             h=h, 
             d=d, 
             t=t, 
             p=p, 
             time=self.time_cost['billable_time'], 
-            cost=self.time_cost['cost']
+            cost=self.time_cost['cost'],
+            latency=time_taken * 1000,
         )
 
+    def start_live(self, h: int, d: int, t: str, p: int, sampling: str='pseudo') -> None:
+        """
+        Analyses the history as analyse_risk does, then keeps what is needed
+        to carry the analysis on as new bars come in: the returns of the
+        lookback window with their running sums, the signals waiting for
+        their exit bar and running aggregates of the summary.
+        """
+        self.analyse_risk(h, d, t, p, sampling)
+        frame = self.data
+        returns = np.nan_to_num(frame.Close.pct_change(1).to_numpy())
+        window = deque(returns[max(len(returns) - h + 1, 0):].tolist(), maxlen=h - 1)
+        entries = self.signals[self.signals + p >= len(returns)]
+        cumulative = np.cumsum(self.profit_loss)
+        summary = self.get_summary
+        self.live = {
+            "h": h, "d": d, "t": t.lower(), "p": p, "sampling": sampling,
+            "window": window,
+            "sum": math.fsum(window),
+            "squares": math.fsum(r * r for r in window),
+            "pending": deque(entries.tolist()),
+            # prices of the history followed by the bars appended, the buffers
+            # having spare capacity, and how many of them the frame holds
+            "prices": {
+                "dates": frame.index.to_numpy(dtype="datetime64[ns]"),
+                "open": frame.Open.to_numpy(dtype=float),
+                "high": frame.High.to_numpy(dtype=float),
+                "low": frame.Low.to_numpy(dtype=float),
+                "close": frame.Close.to_numpy(dtype=float),
+                "volume": frame.Volume.to_numpy(dtype=float),
+                "buy": frame.Buy.to_numpy(dtype=int),
+                "sell": frame.Sell.to_numpy(dtype=int),
+                "count": len(frame),
+                "joined": len(frame),
+            },
+            # result arrays are views of buffers with spare capacity
+            "buffers": {
+                "signals": self.signals,
+                "var95s": self.var95s,
+                "var99s": self.var99s,
+                "profit_loss": self.profit_loss,
+            },
+            "totals": {
+                "var95": float(self.var95s.sum()),
+                "var99": float(self.var99s.sum()),
+                "profit_loss": summary["profit_loss"],
+                "squares": float((self.profit_loss ** 2).sum()),
+                "hits": int((self.profit_loss > 0).sum()),
+                "peak": float(max(cumulative.max(), 0.0)) if len(cumulative) else 0.0,
+                "max_drawdown": summary["max_drawdown"],
+            },
+        }
+
+    def add_bars(self, bars: list[dict]) -> dict:
+        """
+        Carries the live analysis on over new bars. Only the bars appended
+        are checked for patterns, each updates the running sums of the
+        lookback window in constant time, and only the signals they fire
+        are simulated, in a single batch. Signals whose exit bar arrived are
+        settled and the aggregates updated without going over the history.
+        """
+        import pandas as pd
+
+        live = self.live
+        h, p, t = live["h"], live["p"], live["t"]
+        prices = live["prices"]
+        first = prices["count"]
+        new = self._parse_bars(bars)
+        new = {key: values[new["dates"] > prices["dates"][first - 1]] for key, values in new.items()}
+        added = len(new["dates"])
+        # bars are written past the count of the buffers, and only counted in
+        # once their signals are simulated so that a failure leaves no trace
+        for key, values in new.items():
+            prices[key] = self._append(prices[key], first, values)
+        for key in ("buy", "sell"):
+            prices[key] = self._append(prices[key], first, np.zeros(added, dtype=int))
+        last = first + added
+        close = prices["close"][:last]
+        buy, sell = self._detect_bars(prices["open"][:last], close, start=first)
+        prices["buy"][buy] = 1
+        prices["sell"][sell] = 1
+        target = prices["sell"] if t == "sell" else prices["buy"]
+
+        window = deque(live["window"], maxlen=live["window"].maxlen)
+        # resynchronised once per batch so that rounding errors don't build up
+        total, squares = math.fsum(window), math.fsum(r * r for r in window)
+        fired, means, stds = [], [], []
+        for i in range(first, last):
+            if i >= h and target[i] == 1:
+                count = h - 1
+                mean = total / count
+                fired.append(i)
+                means.append(mean)
+                stds.append(math.sqrt(max((squares - total * mean) / (count - 1), 0.0)))
+            # the return of the bar joins the window of the next one
+            returns = close[i] / close[i - 1] - 1
+            if len(window) == window.maxlen:
+                total -= window[0]
+                squares -= window[0] ** 2
+            window.append(returns)
+            total += returns
+            squares += returns ** 2
+
+        totals = live["totals"]
+        buffers = live["buffers"]
+        signals = len(self.signals)
+        if fired:
+            self.service.reset_invocations()
+            start = time.time()
+            var95, var99 = self.service.get_var9599_batch(
+                np.array(means), np.array(stds), live["d"], live["sampling"]
+            )
+            self._bill_live(time.time() - start, signals + len(fired))
+            var95, var99 = var95.mean(axis=0), var99.mean(axis=0)
+            totals["var95"] += float(var95.sum())
+            totals["var99"] += float(var99.sum())
+            for name, values in (("signals", fired), ("var95s", var95), ("var99s", var99)):
+                buffers[name] = self._append(buffers[name], signals, values)
+                setattr(self, name, buffers[name][:signals + len(fired)])
+            live["pending"].extend(fired)
+
+        prices["count"] = last
+        live["window"], live["sum"], live["squares"] = window, total, squares
+
+        settled = []
+        pending = live["pending"]
+        while pending and pending[0] + p < len(close):
+            i = pending.popleft()
+            profit_loss = float(self._compute_profit_loss(t, close[i], close[i + p]))
+            settled.append(profit_loss)
+            totals["profit_loss"] += profit_loss
+            totals["squares"] += profit_loss ** 2
+            totals["hits"] += profit_loss > 0
+            totals["peak"] = max(totals["peak"], totals["profit_loss"])
+            totals["max_drawdown"] = max(totals["max_drawdown"], totals["peak"] - totals["profit_loss"])
+        if settled:
+            trades = len(self.profit_loss)
+            buffers["profit_loss"] = self._append(buffers["profit_loss"], trades, settled)
+            self.profit_loss = buffers["profit_loss"][:trades + len(settled)]
+        self.summary = self._live_summary()
+        self._results_changed()
+        return {
+            "bars": added,
+            "signals": [
+                {"date": str(pd.Timestamp(prices["dates"][i])), "var95": float(v95), "var99": float(v99)}
+                for i, v95, v99 in zip(fired, self.var95s[signals:], self.var99s[signals:])
+            ],
+            "settled": len(settled),
+            "summary": self.summary,
+        }
+
+    def sweep(self, hs: list[int], ps: list[int], d: int, t: str, sampling: str='pseudo') -> dict:
+        """
+        Evaluates every combination of the lookbacks and holding periods given
+        in one pass. The returns and the signals are shared by all of them:
+        rolling means and standard deviations are computed for all lookbacks
+        at once from cumulative sums, and the simulations of the distinct
+        means and standard deviations are sent to the service in batches.
+        Risks only depend on the lookback and profit/loss on the holding
+        period, which only decides the signals considered through it.
+        """
+        if t.lower() == "sell":
+            target = self.data.Sell
+        elif t.lower() == "buy":
+            target = self.data.Buy
+
+        close = self.data.Close.to_numpy()
+        returns = np.nan_to_num(self.data.Close.pct_change(1).to_numpy())
+        sums = np.concatenate(([0.0], np.cumsum(returns)))
+        squares = np.concatenate(([0.0], np.cumsum(returns ** 2)))
+        fired = np.flatnonzero(target.to_numpy() == 1)
+
+        # one row per lookback, one column per signal, the window of a signal
+        # being the h-1 returns of the h closes preceding it
+        lookbacks = np.array(hs)[:, None]
+        valid = fired[None, :] >= lookbacks
+        first = np.clip(fired[None, :] - lookbacks + 1, 0, None)
+        count = lookbacks - 1
+        window_sums = sums[fired][None, :] - sums[first]
+        window_squares = squares[fired][None, :] - squares[first]
+        means = window_sums / count
+        stds = np.sqrt(np.clip((window_squares - window_sums * means) / (count - 1), 0, None))
+
+        pairs, inverse = np.unique(
+            np.column_stack((means[valid], stds[valid])), axis=0, return_inverse=True
+        )
+        self.service.reset_invocations()
+        start = time.time()
+        var95, var99 = self.service.get_var9599_batch(pairs[:, 0], pairs[:, 1], d, sampling)
+        time_taken = time.time() - start
+        var95s = np.full(valid.shape, np.nan)
+        var99s = np.full(valid.shape, np.nan)
+        var95s[valid] = var95.mean(axis=0)[inverse.ravel()]
+        var99s[valid] = var99.mean(axis=0)[inverse.ravel()]
+
+        # one row per holding period, one column per signal
+        periods = np.array(ps)[:, None]
+        exits = fired[None, :] + periods
+        closed = exits < len(close)
+        profit_loss = self._compute_profit_loss(
+            trade=t.lower(),
+            entry_price=close[fired][None, :],
+            exit_price=close[np.where(closed, exits, fired[None, :])],
+        )
+
+        grid = []
+        for n, h in enumerate(hs):
+            signals = int(valid[n].sum())
+            for m, p in enumerate(ps):
+                trades = valid[n] & closed[m]
+                grid.append({
+                    "h": h,
+                    "p": p,
+                    "signals": signals,
+                    "var95": self._compute_avg(var95s[n, valid[n]]),
+                    "var99": self._compute_avg(var99s[n, valid[n]]),
+                    "trades": int(trades.sum()),
+                    "profit_loss": float(profit_loss[m, trades].sum()),
+                })
+        time_cost = self.service.bill_analysis(time_taken)
+        time_cost.update(
+            CostCalculator.unit_costs(
+                cost=time_cost['cost'],
+                signals=len(pairs),
+                shots=len(pairs) * d * self.service.runs,
+            )
+        )
+        return {"grid": grid, "simulations": len(pairs), "time_cost": time_cost}
+
     def service_scaled_ready(self) -> bool:
         """
         Checks that the service scale specified by the user is complete.
@@ -166,51 +531,75 @@ class Analyser:
         that the service in use is kept along with the scale specified with
         no lurking results.
         """
-        self.var95s.clear()
-        self.var99s.clear()
-        self.profit_loss.clear()
+        self.signals = np.empty(0, dtype=int)
+        self.var95s = np.empty(0)
+        self.var99s = np.empty(0)
+        self.profit_loss = np.empty(0)
+        self.summary = None
+        # bars appended live are kept in the prices when the analysis goes
+        self._data = self.data
+        self.live = None
         self.analysis_complete = False
+        self._results_changed()
         if self.time_cost:
-            self.time_cost["billable_time"] = ""
-            self.time_cost["cost"] = ""
+            for key in self.time_cost:
+                self.time_cost[key] = ""
 
-    def _detect_signals(self) -> None:
+    @staticmethod
+    def _detect_signals(frame, start: int=2) -> None:
         """
-        Gets all the buy/sell signals. The method is called upon the creation
-        of an object of this class to ready the data on warmup as requested.
+        Gets all the buy/sell signals of the frame given. The method is called
+        upon the creation of an object of this class to ready the data on warmup
+        as requested. Bars before start are not checked again.
         """
-        for i in range(2, len(self.data)): 
+        buy, sell = Analyser._detect_bars(
+            frame.Open.to_numpy(), frame.Close.to_numpy(), start
+        )
+        frame.iloc[buy, frame.columns.get_loc('Buy')] = 1
+        frame.iloc[sell, frame.columns.get_loc('Sell')] = 1
+
+    @staticmethod
+    def _detect_bars(opens: np.ndarray, closes: np.ndarray, start: int=2) -> tuple:
+        """
+        Positions of the Three Soldiers (buy) and Three Crows (sell) patterns
+        completed by the bars from start on.
+        """
+        Open, Close = opens.tolist(), closes.tolist()
+        buy, sell = [], []
+        for i in range(max(start, 2), len(Close)): 
 
             body = 0.01
 
             # Three Soldiers
-            if (self.data.Close[i] - self.data.Open[i]) >= body  \
-        and self.data.Close[i] > self.data.Close[i-1]  \
-        and (self.data.Close[i-1] - self.data.Open[i-1]) >= body  \
-        and self.data.Close[i-1] > self.data.Close[i-2]  \
-        and (self.data.Close[i-2] - self.data.Open[i-2]) >= body:
-                self.data.at[self.data.index[i], 'Buy'] = 1
+            if (Close[i] - Open[i]) >= body  \
+        and Close[i] > Close[i-1]  \
+        and (Close[i-1] - Open[i-1]) >= body  \
+        and Close[i-1] > Close[i-2]  \
+        and (Close[i-2] - Open[i-2]) >= body:
+                buy.append(i)
 
             # Three Crows
-            if (self.data.Open[i] - self.data.Close[i]) >= body  \
-        and self.data.Close[i] < self.data.Close[i-1] \
-        and (self.data.Open[i-1] - self.data.Close[i-1]) >= body  \
-        and self.data.Close[i-1] < self.data.Close[i-2]  \
-        and (self.data.Open[i-2] - self.data.Close[i-2]) >= body:
-                self.data.at[self.data.index[i], 'Sell'] = 1
+            if (Open[i] - Close[i]) >= body  \
+        and Close[i] < Close[i-1] \
+        and (Open[i-1] - Close[i-1]) >= body  \
+        and Close[i-1] < Close[i-2]  \
+        and (Open[i-2] - Close[i-2]) >= body:
+                sell.append(i)
+        return buy, sell
 
-    def _save_results_s3(self, h: int, d: int, t: str, p: int, time: float, cost: float) -> None:
+    def _save_results_s3(self, s: str, h: int, d: int, t: str, p: int, time: float, cost: float,
+                         latency: float) -> None:
         """
         Stores relevant information to the latest analysis in a file of an S3 bucket.
         The method is called once the analysis is complete and achieve its purposes
         by calling the lambda function created to manage our system's storage.
         """
         try:
-            client = http.client.HTTPSConnection(self.lambda_s3_host)
+            client = connect(self.lambda_s3_host)
             payload = json.dumps({
                 "action": "write",
-                "s": self.service.name, 
-                "r": self.service.runs,
+                "s": s, 
+                "r": self.service.runs if s == self.service.name else 1,
                 "h": h,
                 "d": d,
                 "t": t,
@@ -220,6 +609,8 @@ class Analyser:
                 "av99": self.get_avg_var9599['var99'],
                 "time": time,
                 "cost": cost,
+                "latency": latency,
+                "signals": len(self.var95s),
             })
             client.request("POST", "/default/function_three", payload)
             response = client.getresponse()
@@ -227,12 +618,132 @@ class Analyser:
         except IOError:
             print(f'Couldn\'t connect to {self.lambda_s3_host}') 
 
+    def _results_changed(self) -> None:
+        """
+        Gives the results a new version, which the charts cached for the
+        previous one are dropped with.
+        """
+        self.version = next(self.versions)
+        self.charts = {}
+
+    def _bill_live(self, time_taken: float, signals: int) -> None:
+        """
+        Adds the cost of simulating the signals of new bars to the cost of
+        the analysis carried on live.
+        """
+        time_cost = self.service.bill_analysis(time_taken)
+        time_cost["billable_time"] += self.time_cost["billable_time"]
+        time_cost["cost"] += self.time_cost["cost"]
+        time_cost.update(
+            CostCalculator.unit_costs(
+                cost=time_cost['cost'],
+                signals=signals,
+                shots=signals * self.live["d"] * self.service.runs,
+            )
+        )
+        self.time_cost = time_cost
+
+    def _live_summary(self) -> dict:
+        """
+        Same aggregates as _summarise, read from the running totals of the
+        live analysis.
+        """
+        totals = self.live["totals"]
+        signals = len(self.signals)
+        trades = len(self.profit_loss)
+        mean = totals["profit_loss"] / trades if trades else 0.0
+        variance = (totals["squares"] - totals["profit_loss"] * mean) / (trades - 1) if trades > 1 else 0.0
+        std = math.sqrt(max(variance, 0.0))
+        return {
+            'signals': signals,
+            'avg_var95': totals["var95"] / signals if signals else 0.0,
+            'avg_var99': totals["var99"] / signals if signals else 0.0,
+            'trades': trades,
+            'profit_loss': totals["profit_loss"],
+            'hit_rate': totals["hits"] / trades if trades else 0.0,
+            'max_drawdown': totals["max_drawdown"],
+            'sharpe': mean / std if std else 0.0,
+        }
+
+    def _summarise(self) -> dict:
+        """
+        Computes the averages and total along with the hit rate, the maximum
+        drawdown of the cumulative profit/loss and the Sharpe ratio of the
+        trades, each in a single pass over the result arrays.
+        """
+        trades = len(self.profit_loss)
+        cumulative = np.cumsum(self.profit_loss)
+        peaks = np.maximum.accumulate(np.concatenate(([0.0], cumulative)))[1:]
+        std = self.profit_loss.std(ddof=1) if trades > 1 else 0.0
+        return {
+            'signals': len(self.signals),
+            'avg_var95': self._compute_avg(self.var95s),
+            'avg_var99': self._compute_avg(self.var99s),
+            'trades': trades,
+            'profit_loss': float(cumulative[-1]) if trades else 0.0,
+            'hit_rate': float((self.profit_loss > 0).mean()) if trades else 0.0,
+            'max_drawdown': float((peaks - cumulative).max()) if trades else 0.0,
+            'sharpe': float(self.profit_loss.mean() / std) if std else 0.0,
+        }
+
+    @staticmethod
+    def _parse_bars(bars: list[dict]) -> dict:
+        """
+        Arrays of the bars given as {"date", "open", "high", "low", "close",
+        "volume"}, in chronological order.
+        """
+        dates = np.array([np.datetime64(bar['date'], 'ns') for bar in bars], dtype="datetime64[ns]")
+        order = np.argsort(dates, kind="stable")
+        return {
+            "dates": dates[order],
+            "open": np.array([float(bar['open']) for bar in bars])[order],
+            "high": np.array([float(bar['high']) for bar in bars])[order],
+            "low": np.array([float(bar['low']) for bar in bars])[order],
+            "close": np.array([float(bar['close']) for bar in bars])[order],
+            "volume": np.array([float(bar.get('volume', 0)) for bar in bars])[order],
+        }
+
+    def _join_bars(self) -> "pd.DataFrame":
+        """
+        Joins the bars appended live since the last join to the frame, in a
+        single concatenation.
+        """
+        import pandas as pd
+
+        prices = self.live["prices"]
+        rows = slice(prices["joined"], prices["count"])
+        bars = pd.DataFrame({
+            'Open': prices["open"][rows],
+            'High': prices["high"][rows],
+            'Low': prices["low"][rows],
+            'Close': prices["close"][rows],
+            'Adj Close': prices["close"][rows],
+            'Volume': prices["volume"][rows],
+            'Buy': prices["buy"][rows],
+            'Sell': prices["sell"][rows],
+        }, index=pd.DatetimeIndex(prices["dates"][rows]))
+        prices["joined"] = prices["count"]
+        return pd.concat([self._data, bars])
+
+    @staticmethod
+    def _append(buffer: np.ndarray, count: int, values: list | np.ndarray) -> np.ndarray:
+        """
+        Writes the values after the count first ones of the buffer, doubling
+        its capacity when they don't fit. Returns the buffer holding them.
+        """
+        if count + len(values) > len(buffer):
+            grown = np.empty(max(2 * len(buffer), count + len(values)), dtype=buffer.dtype)
+            grown[:count] = buffer[:count]
+            buffer = grown
+        buffer[count:count + len(values)] = values
+        return buffer
+
     @staticmethod
-    def _compute_avg(iterable: list | tuple) -> float:
-        return sum(iterable) / len(iterable)
+    def _compute_avg(iterable: list | tuple | np.ndarray) -> float:
+        return float(np.mean(iterable)) if len(iterable) else 0.0
     
     @staticmethod
-    def _compute_profit_loss(trade: str, entry_price: float, exit_price: float) -> float:
+    def _compute_profit_loss(trade: str, entry_price: np.ndarray, exit_price: np.ndarray) -> np.ndarray:
         if trade == "buy":
             return exit_price - entry_price
         elif trade == "sell":
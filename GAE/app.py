@@ -1,22 +1,48 @@
 import os
+import threading
+import charts
+import local_var
+import wire
 
-from flask import Flask, request, render_template
+from flask import Flask, Response, request, render_template
 from flask.json import jsonify
 
-from analysis import Analyser
+from analysis import Analyser, get_data
+from services import Lambda, SimulationError
+from advisor import Advisor
 from dotenv import load_dotenv
 
 load_dotenv()
 
 app = Flask(__name__)
 analyser = None
+# tells the results of this process apart from those of other instances in ETags
+INSTANCE = os.urandom(4).hex()
+CHART_WIDTH = 999
+
+
+@app.errorhandler(SimulationError)
+def simulation_failed(error: SimulationError):
+    return {"result": f"simulations failed: {error}"}, 502
+
+
+@app.route("/_ah/warmup", methods=['GET'])
+def api_ah_warmup():
+    # App Engine warmup request of a new instance, the prices and the modules
+    # they need are loaded in the background so the instance answers at once
+    threading.Thread(target=get_data, daemon=True).start()
+    return "", 200
 
 
 @app.route("/warmup", methods=['POST'])
 def api_warmup():
-    global analyser
     data = request.json
-    analyser = Analyser(s=data.get('s'), r=int(data.get('r')))
+    keep_warm = data.get('keep_warm')
+    if keep_warm is not None:
+        keep_warm = float(keep_warm)
+        if not keep_warm >= Lambda.KEEP_WARM_MIN_S:
+            return {"result": f"keep_warm must be at least {Lambda.KEEP_WARM_MIN_S} seconds"}, 400
+    warmup(s=data.get('s'), r=int(data.get('r')), keep_warm=keep_warm)
     return {"result": "ok"}
     
 
@@ -46,15 +72,71 @@ def api_get_endpoints():
 def api_analyse():
     global analyser
     data = request.json
+    sampling = data.get('sampling', 'pseudo')
+    if sampling not in wire.SAMPLING:
+        return unknown_sampling(sampling)
+    engine = data.get('engine', 'service')
+    if engine not in ("service",) + local_var.ENGINES:
+        engines = ", ".join(("service",) + local_var.ENGINES)
+        return {"result": f"unknown engine {engine}, expected one of {engines}"}, 400
+    h, d = int(data.get('h')), int(data.get('d'))
+    if engine in local_var.ENGINES and (h < 2 or d < 1):
+        return {"result": f"the {engine} engine needs h of at least 2 and d of at least 1"}, 400
     analyser.analyse_risk(
+        h=h,
+        d=d,
+        t=data.get('t'),
+        p=int(data.get('p')),
+        sampling=sampling,
+        engine=engine,
+    )
+    return {"result": "ok"}
+
+
+@app.route("/sweep", methods=['POST'])
+def api_sweep():
+    global analyser
+    data = request.json
+    sampling = data.get('sampling', 'pseudo')
+    if sampling not in wire.SAMPLING:
+        return unknown_sampling(sampling)
+    return analyser.sweep(
+        hs=parse_range(data.get('h')),
+        ps=parse_range(data.get('p')),
+        d=int(data.get('d')),
+        t=data.get('t'),
+        sampling=sampling,
+    )
+
+
+@app.route("/live/start", methods=['POST'])
+def api_live_start():
+    global analyser
+    data = request.json
+    sampling = data.get('sampling', 'pseudo')
+    if sampling not in wire.SAMPLING:
+        return unknown_sampling(sampling)
+    analyser.start_live(
         h=int(data.get('h')),
         d=int(data.get('d')),
         t=data.get('t'),
         p=int(data.get('p')),
+        sampling=sampling,
     )
     return {"result": "ok"}
 
 
+@app.route("/live/bars", methods=['POST'])
+def api_live_bars():
+    global analyser
+    if not analyser or not analyser.live:
+        return {"result": "live analysis not started, please call /live/start first"}, 400
+    bars = request.json.get('bars')
+    if not isinstance(bars, list):
+        return {"result": "bars missing, please send them as a list"}, 400
+    return analyser.add_bars(bars)
+
+
 @app.route("/get_sig_vars9599", methods=['GET'])
 def api_get_sig_vars9599():
     global analyser
@@ -79,6 +161,12 @@ def api_get_tot_profit_loss():
     return analyser.get_tot_profit_loss
 
 
+@app.route("/get_summary", methods=['GET'])
+def api_get_summary():
+    global analyser
+    return analyser.get_summary
+
+
 @app.route("/get_chart_url", methods=['GET'])
 def api_get_chart_url():
     url = os.getenv('GAE_URL') + '/chart'
@@ -96,6 +184,26 @@ def api_get_audit():
     return Analyser.get_audit()
 
 
+@app.route("/recommend_scale", methods=['POST'])
+def api_recommend_scale():
+    global analyser
+    data = request.json
+    latency = data.get('latency')
+    budget = data.get('budget')
+    advisor = Advisor(Analyser.get_audit(), Analyser.count_signals)
+    recommendation = advisor.recommend(
+        h=int(data.get('h')),
+        d=int(data.get('d')),
+        t=data.get('t'),
+        p=int(data.get('p')),
+        latency=float(latency) if latency is not None else None,
+        budget=float(budget) if budget is not None else None,
+    )
+    if "s" in recommendation and str(data.get('warmup', 'false')).lower() == 'true':
+        warmup(s=recommendation['s'], r=recommendation['r'])
+    return recommendation
+
+
 @app.route("/reset", methods=['GET'])
 def api_reset():
     global analyser
@@ -118,32 +226,87 @@ def api_scaled_terminated():
     return {"terminated": "false"}
 
 
+@app.route("/chart_data", methods=['GET'])
+def api_chart_data():
+    global analyser
+    if not analyser or not analyser.analysis_complete:
+        return {"result": "no analysis data, please complete the analysis first"}
+    width = max(int(request.args.get('width', 1000)), 4)
+    method = request.args.get('method', 'lttb')
+    output = request.args.get('format', 'json')
+    if method not in charts.METHODS:
+        method = 'lttb'
+    etag = chart_etag(width, method, output)
+    if etag in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+    chart = analyser.get_chart_data(width, method)
+    if output == 'binary':
+        response = Response(charts.encode_binary(chart), content_type=charts.CONTENT_TYPE)
+    else:
+        response = jsonify({**charts.encode_json(chart), "version": analyser.version})
+    response.set_etag(etag)
+    return response
+
+
 @app.route('/chart', methods=['GET'])
 def view_chart():
     global analyser
     if analyser.analysis_complete:
-        risk_var95s: list = analyser.get_var9599['var95']
-        risk_var99s: list = analyser.get_var9599['var99']
-
-        avg_risk_var95: float = analyser.get_avg_var9599['var95']
-        avg_risk_var99: float = analyser.get_avg_var9599['var99']
-        avg_risk_var95s = [avg_risk_var95 for _ in range(len(risk_var95s))]
-        avg_risk_var99s = [avg_risk_var99 for _ in range(len(risk_var99s))]
-        signal_names = ['Signal {}'.format(i) for i in range(len(risk_var95s))]
+        etag = chart_etag(CHART_WIDTH, 'lttb', 'html')
+        if etag in request.if_none_match:
+            return Response(status=304, headers={"ETag": f'"{etag}"'})
+        chart = analyser.get_chart_data(CHART_WIDTH, 'lttb')
+        points = len(chart['index'])
         risks = [
-            risk_var95s,
-            risk_var99s,
-            avg_risk_var95s,
-            avg_risk_var99s,
+            chart['var95'].tolist(),
+            chart['var99'].tolist(),
+            [chart['avg_var95']] * points,
+            [chart['avg_var99']] * points,
         ]
-    
+        signal_names = ['Signal {}'.format(i) for i in chart['index']]
+
         risks = '|'.join(','.join(map(str, risk)) for risk in risks)
         signal_names = '|'.join(signal_names)
-        return render_template('chart.html', 
-                            risks=risks, 
-                            signal_names=signal_names)
+        response = Response(render_template('chart.html', 
+                                            risks=risks, 
+                                            signal_names=signal_names))
+        response.set_etag(etag)
+        return response
     return "<h1>No analysis data, please complete the analysis first.</h1>"
 
 
+def chart_etag(width: int, method: str, output: str) -> str:
+    """
+    Charts only change with the results, so they are tagged with the
+    version of the results along with what shapes them.
+    """
+    return f"{INSTANCE}-{analyser.version}-{width}-{method}-{output}"
+
+
+def unknown_sampling(sampling: str) -> tuple:
+    return {"result": f"unknown sampling {sampling}, expected one of {', '.join(wire.SAMPLING)}"}, 400
+
+
+def parse_range(values: list | dict) -> list[int]:
+    """
+    Ranges are given either as a list of values or as a start, stop and
+    step, the stop being excluded as in python ranges.
+    """
+    if isinstance(values, dict):
+        return list(range(int(values['start']), int(values['stop']), int(values.get('step', 1))))
+    return [int(value) for value in values]
+
+
+def warmup(s: str, r: int, keep_warm: float | None=None) -> None:
+    """
+    Replaces the analyser with one warmed up to the scale requested. Lambda
+    containers kept warm for the previous analyser stop being pinged.
+    """
+    global analyser
+    if analyser and analyser.service.name == "lambda":
+        analyser.service.terminate()
+    analyser = Analyser(s=s, r=r, keep_warm=keep_warm)
+
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""
+Downsampling of the risks of an analysis to the width of the chart they are
+drawn on. Thousands of signals can't be told apart on a few hundred pixels,
+so the signals kept are picked to preserve the shape of both series, with
+Largest-Triangle-Three-Buckets (lttb) or the extremes of each bucket
+(minmax). The var95 and var99 series share the signals kept so that they
+are drawn against the same axis.
+
+The binary format packs, little-endian, the number of signals (uint32), the
+number of signals kept n (uint32) and the average var95 and var99 (float64),
+followed by the n signal positions (uint32) and the n var95 then n var99
+(float32), ready to be read as typed arrays.
+"""
+import struct
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+CONTENT_TYPE = "application/octet-stream"
+HEADER = struct.Struct("<IIdd")
+
+
+def downsample(var95: np.ndarray, var99: np.ndarray, avg_var95: float, avg_var99: float,
+               width: int, method: str="lttb") -> dict:
+    """
+    Keeps at most width signals of the series, every one of them when they
+    fit. Each series picks half of them, the extremes of minmax being two
+    per bucket.
+    """
+    if len(var95) <= width:
+        index = np.arange(len(var95))
+    elif method == "minmax":
+        index = np.union1d(minmax(var95, width // 4), minmax(var99, width // 4))
+    else:
+        index = np.union1d(lttb(var95, width // 2), lttb(var99, width // 2))
+    return {
+        "signals": len(var95),
+        "index": index,
+        "var95": var95[index],
+        "var99": var99[index],
+        "avg_var95": avg_var95,
+        "avg_var99": avg_var99,
+    }
+
+
+def lttb(values: np.ndarray, points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: the first and last values are kept and
+    the others split in points - 2 buckets. In each bucket the value kept
+    forms the largest triangle with the one kept in the previous bucket and
+    the average of the next bucket. Returns the positions of the values kept.
+    """
+    count = len(values)
+    if points >= count:
+        return np.arange(count)
+    if points < 3:
+        return np.array([0, count - 1])[:max(points, 1)]
+
+    positions = np.arange(count, dtype=float)
+    every = (count - 2) / (points - 2)
+    kept = np.empty(points, dtype=int)
+    kept[0], kept[-1] = 0, count - 1
+    previous = 0
+    for n in range(points - 2):
+        start = int(n * every) + 1
+        end = int((n + 1) * every) + 1
+        following = slice(end, min(int((n + 2) * every) + 1, count))
+        next_x = positions[following].mean()
+        next_y = values[following].mean()
+        areas = np.abs(
+            (positions[previous] - next_x) * (values[start:end] - values[previous])
+            - (positions[previous] - positions[start:end]) * (next_y - values[previous])
+        )
+        previous = start + int(areas.argmax())
+        kept[n + 1] = previous
+    return kept
+
+
+def minmax(values: np.ndarray, buckets: int) -> np.ndarray:
+    """
+    Splits the values in buckets of equal sizes and keeps the smallest and
+    largest of each. Returns the positions of the values kept, in order.
+    """
+    count = len(values)
+    if 2 * max(buckets, 1) >= count:
+        return np.arange(count)
+    edges = np.linspace(0, count, max(buckets, 1) + 1).astype(int)
+    kept = np.empty(2 * (len(edges) - 1), dtype=int)
+    for n, (start, end) in enumerate(zip(edges[:-1], edges[1:])):
+        bucket = values[start:end]
+        kept[2 * n] = start + int(bucket.argmin())
+        kept[2 * n + 1] = start + int(bucket.argmax())
+    return np.unique(kept)
+
+
+def encode_json(chart: dict) -> dict:
+    return {
+        key: value.tolist() if isinstance(value, np.ndarray) else value
+        for key, value in chart.items()
+    }
+
+
+def encode_binary(chart: dict) -> bytes:
+    header = HEADER.pack(chart["signals"], len(chart["index"]), chart["avg_var95"], chart["avg_var99"])
+    return (
+        header
+        + chart["index"].astype("<u4").tobytes()
+        + chart["var95"].astype("<f4").tobytes()
+        + chart["var99"].astype("<f4").tobytes()
+    )
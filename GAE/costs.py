@@ -1,26 +1,37 @@
+import math
+
+
 class CostCalculator:
     """
     The specifications are the same across the three Lambda Functions
     created for the system. EC2 specifications are also the same for
     all instances as these are created off an image.
     """
-    EC2_PRICE_T2MICRO_1H = 0.0116               
-    LAMBDA_COMPUTE_PRICE_100S = 0.0000166667    
-    LAMBDA_MEMORY_ALLOCATED_GB = 128            
-    LAMBDA_REQUEST_PRICE_1M = 0.2               
+    EC2_PRICE_T2MICRO_1H = 0.0116
+    EC2_MINIMUM_BILLED_S = 60
+    LAMBDA_COMPUTE_PRICE_100S = 0.0000166667
+    LAMBDA_MEMORY_ALLOCATED_GB = 128
+    LAMBDA_REQUEST_PRICE_1M = 0.2
+    LAMBDA_BILLING_GRANULARITY_MS = 1
 
     @classmethod
-    def ec2_cost(cls, time_taken: float, instances: int) -> dict:
+    def ec2_cost(cls, time_taken: float, instances: int, billed_before: float=0) -> dict:
         """
         Calculates the cost of ec2 based on the EC2 image specifications.
-        The calculation is done for one instance where the official price 
-        for one hour is used to work out the cost of the computation and 
-        then the total cost is established by multiplying the result by
-        the amount of instances used. The time is then returned in ms.
+        The instances are billed for as long as they run, idle time between
+        signals included, per second with a minimum of one minute per launch.
+        The minimum is only charged against the seconds not already billed
+        to the same instances by earlier analyses. The total cost is then
+        established by multiplying the result by the amount of instances
+        used. The time is then returned in ms.
         https://aws.amazon.com/ec2/pricing/on-demand/
         """
-        cost = (time_taken * cls.EC2_PRICE_T2MICRO_1H / 3600) * instances 
-        time_ms = time_taken * 1000 
+        billed_seconds = max(
+            math.ceil(time_taken),
+            cls.EC2_MINIMUM_BILLED_S - math.ceil(billed_before),
+        )
+        cost = (billed_seconds * cls.EC2_PRICE_T2MICRO_1H / 3600) * instances
+        time_ms = billed_seconds * 1000
         return {"billable_time": time_ms, "cost": cost}
 
     @classmethod
@@ -31,12 +42,35 @@ class CostCalculator:
         The time is also converted to ms when return so that the results
         align with EC2's. https://aws.amazon.com/lambda/pricing/
         """
-        total_compute_seconds = instances * time_taken
+        return cls.lambda_invocations_cost([time_taken] * instances)
+
+    @classmethod
+    def lambda_invocations_cost(cls, durations: list[float]) -> dict:
+        """
+        Calculates the cost of a set of Lambda invocations from their own
+        durations. Each invocation is rounded up to the billing granularity
+        and only the time spent in the function is billed, the idle time
+        between invocations is free. One request is charged per invocation.
+        """
+        granularity = cls.LAMBDA_BILLING_GRANULARITY_MS
+        billed_ms = sum(
+            math.ceil(duration * 1000 / granularity) * granularity
+            for duration in durations
+        )
         allocated_memory_gb = cls.LAMBDA_MEMORY_ALLOCATED_GB / 1024
-        total_compute_gb_s = total_compute_seconds * allocated_memory_gb
+        total_compute_gb_s = (billed_ms / 1000) * allocated_memory_gb
         compute_cost = total_compute_gb_s * cls.LAMBDA_COMPUTE_PRICE_100S
-        total_requests = instances
-        request_cost = (total_requests / 1000000) * cls.LAMBDA_REQUEST_PRICE_1M
+        request_cost = (len(durations) / 1000000) * cls.LAMBDA_REQUEST_PRICE_1M
         cost = compute_cost + request_cost
-        time_ms = time_taken * 1000
-        return {"billable_time": time_ms, "cost": cost}
\ No newline at end of file
+        return {"billable_time": billed_ms, "cost": cost}
+
+    @staticmethod
+    def unit_costs(cost: float, signals: int, shots: int) -> dict:
+        """
+        Breaks the cost of an analysis down per signal and per thousand
+        simulated shots so that scales and services can be compared.
+        """
+        return {
+            "cost_per_signal": cost / signals if signals else 0.0,
+            "cost_per_1k_shots": cost * 1000 / shots if shots else 0.0,
+        }
@@ -1,17 +1,43 @@
 import os
 import json
 import time
+import threading
 import http.client
+import numpy as np
 
+import wire
 from costs import CostCalculator
 from concurrent.futures import ThreadPoolExecutor
 from abc import ABC, abstractmethod
 
 
+def connect(host: str) -> http.client.HTTPConnection:
+    """
+    Opens a connection to the host of an AWS service. Hosts are reached
+    over HTTPS unless they are given with an http:// scheme, as the local
+    stand-ins used for benchmarking are.
+    """
+    if host.startswith("http://"):
+        return http.client.HTTPConnection(host.removeprefix("http://"))
+    return http.client.HTTPSConnection(host.removeprefix("https://"))
+
+
+class SimulationError(Exception):
+    """
+    Raised when a call of a batch of simulations gets no results back.
+    """
+
+
 class Service(ABC):
     """
     Abstract base class that defines a common interface for services.
     """
+    BATCH_SIZE = 500
+    # shots simulated per call, so that a call stays well within the timeouts
+    # of the workers and of API Gateway whatever the number of shots
+    BATCH_SHOTS = 500_000
+    BUSY_RETRIES = 5
+
     @property
     @abstractmethod
     def get_warmup_cost(self) -> dict:
@@ -26,6 +52,14 @@ class Service(ABC):
     def get_var9599(self, *args, **kwargs) -> tuple:
         pass
 
+    @abstractmethod
+    def get_var9599_batch(self, *args, **kwargs) -> tuple:
+        pass
+
+    @abstractmethod
+    def bill_analysis(self, time_taken: float) -> dict:
+        pass
+
     @abstractmethod
     def terminate(self) -> None:
         pass
@@ -50,6 +84,119 @@ class Service(ABC):
     def _format_callstrings(self, *args, **kwargs) -> dict:
         pass
 
+    @classmethod
+    def _batches(cls, means: np.ndarray, stds: np.ndarray, shots: int) -> list:
+        """
+        Splits the simulations in batches of at most BATCH_SIZE simulations
+        and BATCH_SHOTS shots, a single simulation per batch at the least.
+        """
+        size = max(min(cls.BATCH_SIZE, cls.BATCH_SHOTS // max(shots, 1)), 1)
+        return [
+            (means[i:i + size], stds[i:i + size])
+            for i in range(0, len(means), size)
+        ]
+
+    @staticmethod
+    def _gather_batches(results: list, runs: int, size: int) -> tuple:
+        """
+        Lays the results of batched calls, ordered batch by batch with one
+        call per run, out as arrays with one row per run. A call that got
+        no results back fails the whole batch.
+        """
+        var95 = np.empty((runs, size))
+        var99 = np.empty((runs, size))
+        start = 0
+        for n, result in enumerate(results):
+            if result is None:
+                raise SimulationError(f"a call of simulations {start} onwards got no results")
+            batch_var95, batch_var99 = result
+            var95[n % runs, start:start + len(batch_var95)] = batch_var95
+            var99[n % runs, start:start + len(batch_var99)] = batch_var99
+            if n % runs == runs - 1:
+                start += len(batch_var95)
+        return var95, var99
+
+    def _post_simulation(self, client: http.client.HTTPConnection, path: str,
+                         mean: float | np.ndarray, std: float | np.ndarray,
+                         shots: int, sampling: str) -> tuple:
+        """
+        Posts simulations to a worker. They are packed in the binary wire format
+        as long as the worker answers in it. A worker that answers the request
+        in another format, or rejects its Content-Type (415), is sent JSON from
+        then on. Any other error only sends that call again as JSON. Batches of
+        simulations are returned as arrays and single simulations as values,
+        along with the duration in seconds the worker reports for the call, or
+        None when it doesn't.
+        """
+        if self.wire == "binary":
+            headers = {
+                "Content-Type": wire.CONTENT_TYPE,
+                "Accept": wire.CONTENT_TYPE,
+            }
+            payload = wire.encode_request(mean, std, shots, sampling)
+            response, body = self._post(client, path, payload, headers)
+            binary = response.getheader("Content-Type", "").startswith(wire.CONTENT_TYPE)
+            # a gateway not set up for binary media types answers in base64
+            # text under the binary Content-Type, which the length tells apart
+            if response.status == 200 and binary and wire.is_response(body, np.size(mean)):
+                var95, var99 = wire.decode_response(body)
+                reported = self._reported_duration(
+                    response.getheader("X-Init-Ms"), response.getheader("X-Handler-Ms")
+                )
+                if np.ndim(mean) == 0:
+                    return float(var95[0]), float(var99[0]), reported
+                return var95, var99, reported
+            if response.status in (200, 415):
+                self.wire = "json"
+
+        payload = json.dumps({
+            "mean": np.asarray(mean).tolist(),
+            "std": np.asarray(std).tolist(),
+            "shots": shots,
+            "sampling": sampling,
+        })
+        headers = {
+            "Content-Type": "application/json",
+        }
+        response, body = self._post(client, path, payload, headers)
+        if response.status != 200:
+            raise IOError(f"worker answered {response.status} {response.reason}")
+        data = json.loads(body.decode('utf-8'))
+        reported = self._reported_duration(data.get('init_ms'), data.get('handler_ms'))
+        return data['var95'], data['var99'], reported
+
+    @staticmethod
+    def _reported_duration(init_ms: str | float | None, handler_ms: str | float | None) -> float | None:
+        """
+        Duration in seconds of a call as reported by the worker, the init of
+        a cold container included, or None for workers that don't report it.
+        """
+        if handler_ms is None:
+            return None
+        return (float(init_ms or 0) + float(handler_ms)) / 1000
+
+    def _post(self, client: http.client.HTTPConnection, path: str, payload: bytes | str,
+              headers: dict) -> tuple:
+        """
+        Posts to a worker, retrying after the delay it asks for while it is
+        too busy to take the request (503).
+        """
+        for _ in range(self.BUSY_RETRIES):
+            client.request("POST", path, payload, headers)
+            response = client.getresponse()
+            body = response.read()
+            if response.status != 503:
+                break
+            time.sleep(float(response.getheader("Retry-After", 1)))
+        return response, body
+
+    def reset_invocations(self) -> None:
+        """
+        Clears the durations recorded for the calls made to the service
+        so that the next analysis is billed on its own calls only.
+        """
+        self.invocations = []
+
 
 class EC2(Service):
     def __init__(self, runs: int):
@@ -62,6 +209,9 @@ class EC2(Service):
         self.name = "ec2"
         self.lambda_ec2_host = os.getenv('EC2_URL')
         self.runs = runs
+        self.wire = os.getenv('WIRE_FORMAT', 'binary')
+        self.invocations = []
+        self.billed_time = 0
         self.instances_ids = self._scale()
         self.instances_dns = None 
 
@@ -80,16 +230,48 @@ class EC2(Service):
         """
         return self._format_callstrings(self.instances_dns)
 
-    def get_var9599(self, mean: float, std: float, shots: int) -> tuple:
+    def get_var9599(self, mean: float, std: float, shots: int, sampling: str='pseudo') -> tuple:
         """
         Performs parallel requests to the EC2 instances intended for computations.
         The number of parallel requests is proportional to the number of servers
         launched as per the scale specified by the user.
         """
         with ThreadPoolExecutor() as executor:
-            results = executor.map(lambda dns: self._simulation(dns, mean, std, shots), [dns for dns in self.instances_dns])
+            results = list(executor.map(lambda dns: self._simulation(dns, mean, std, shots, sampling), [dns for dns in self.instances_dns]))
+        if any(result is None for result in results):
+            raise SimulationError(f"{results.count(None)} of {len(results)} simulation calls got no results")
         var95, var99 = zip(*results)
         return var95, var99
+
+    def get_var9599_batch(self, means: np.ndarray, stds: np.ndarray, shots: int,
+                          sampling: str='pseudo') -> tuple:
+        """
+        Performs the simulations of many means and standard deviations in a
+        few requests. They are sent in batches to every EC2 instance in
+        parallel, and the risks are returned as arrays with one row per
+        instance and one column per simulation.
+        """
+        batches = self._batches(means, stds, shots)
+        calls = [(dns, batch) for batch in batches for dns in self.instances_dns]
+        with ThreadPoolExecutor() as executor:
+            results = list(executor.map(
+                lambda call: self._simulation(call[0], *call[1], shots, sampling), calls
+            ))
+        return self._gather_batches(results, len(self.instances_dns), len(means))
+
+    def bill_analysis(self, time_taken: float) -> dict:
+        """
+        EC2 instances are billed for the whole time they are running, idle
+        time between signals included, so the wall-clock time of the analysis
+        is billed on every instance. The seconds already billed to the
+        instances are kept so that the one minute minimum is charged once.
+        The busy time recorded for the calls is reported as a utilisation.
+        """
+        time_cost = CostCalculator.ec2_cost(time_taken, self.runs, self.billed_time)
+        self.billed_time += time_cost["billable_time"] / 1000
+        busy_time = sum(self.invocations) / self.runs
+        time_cost["utilisation"] = min(busy_time / time_taken, 1.0) if time_taken else 0.0
+        return time_cost
     
     def terminate(self) -> None:
         """
@@ -98,7 +280,7 @@ class EC2(Service):
         background without waiting for the instances to be terminated. 
         """
         try:
-            client = http.client.HTTPSConnection(self.lambda_ec2_host)
+            client = connect(self.lambda_ec2_host)
             payload = json.dumps({
                 "action": "terminate",
                 "ids": self.instances_ids
@@ -115,10 +297,11 @@ class EC2(Service):
         Sends a post request to the intermediary lambda function to check 
         whether the EC2 instances are up and running. This is done using 
         the ids stored when the instances were launched. If the scale is
-        ready, the dns of each instance is returned.
+        ready, the dns of each instance is returned and the instances are
+        ready once each of them answers its health check.
         """
         try: 
-            client = http.client.HTTPSConnection(self.lambda_ec2_host)
+            client = connect(self.lambda_ec2_host)
             payload = json.dumps({
                 "action": "confirm_creation",
                 "ids": self.instances_ids
@@ -127,7 +310,7 @@ class EC2(Service):
             response = client.getresponse()
             data = json.loads(response.read().decode('utf-8'))
 
-            if data["warm"] == True:
+            if data["warm"] == True and all(map(self._check_health, data["instances_dns"])):
                 self.instances_dns = data["instances_dns"]
                 return True
             return False
@@ -141,7 +324,7 @@ class EC2(Service):
         stored when the EC2 instances were launched.
         """
         try:
-            client = http.client.HTTPSConnection(self.lambda_ec2_host )
+            client = connect(self.lambda_ec2_host)
             payload = json.dumps({
                 "action": "confirm_termination",
                 "ids": self.instances_ids
@@ -155,6 +338,18 @@ class EC2(Service):
         except IOError:
             print(f'Couldn\'t connect to {self.lambda_ec2_host }') 
 
+    def _check_health(self, dns: str) -> bool:
+        """
+        Probes the health endpoint of an EC2 server, instances passing the
+        AWS status checks may not be serving requests yet.
+        """
+        try:
+            client = http.client.HTTPConnection(dns, timeout=2)
+            client.request("GET", "/health")
+            return client.getresponse().status == 200
+        except (IOError, http.client.HTTPException):
+            return False
+
     def _scale(self) -> list:
         """
         Scales up the number of EC2 instances to the scale specified.
@@ -165,7 +360,7 @@ class EC2(Service):
         """
         start = time.time()
         try:
-            client = http.client.HTTPSConnection(self.lambda_ec2_host)
+            client = connect(self.lambda_ec2_host)
             payload = json.dumps({
                 "action": "create",
                 "r": self.runs
@@ -178,26 +373,20 @@ class EC2(Service):
         except IOError:
             print(f'Couldn\'t connect to {self.lambda_ec2_host}') 
     
-    def _simulation(self, dns: str, mean: float, std: float, shots: int) -> tuple:
+    def _simulation(self, dns: str, mean: float, std: float, shots: int, sampling: str) -> tuple:
         """
         Sends a post request to an EC2 server created during the scale based on the 
         dns provided. The service computes the risks by taking the mean, standard 
-        deviation, and the number of shots.
+        deviation, the number of shots and the sampling strategy of the shots.
         """
         try:
+            start = time.time()
             client = http.client.HTTPConnection(dns, timeout=10)
-            payload = json.dumps({
-                "mean": mean,
-                "std": std,
-                "shots": shots,
-            })
-            headers = {
-                "Content-Type": "application/json",
-            }
-            client.request("POST", "/calculate_var9599", payload, headers)
-            response = client.getresponse()
-            data = json.loads(response.read().decode('utf-8'))
-            return data['var95'], data['var99']
+            var95, var99, _ = self._post_simulation(
+                client, "/calculate_var9599", mean, std, shots, sampling
+            )
+            self.invocations.append(time.time() - start)
+            return var95, var99
         except IOError:
             print(f'Couldn\'t connect to {dns}')
                 
@@ -216,26 +405,53 @@ class EC2(Service):
 
 
 class Lambda(Service):
-    def __init__(self, runs: int):
+    KEEP_WARM_HOLD_MS = 100
+    # shortest keep_warm interval in seconds, so that pings stay few and apart
+    KEEP_WARM_MIN_S = 5
+
+    def __init__(self, runs: int, keep_warm: float | None=None):
         """
         Constructor initialises the DNS for the Lambda function. When an object 
         is created, the Lambda function is scaled to the number of runs 
-        specified by the user.
+        specified by the user. Given a keep_warm interval in seconds, the
+        runs containers are then kept warm until the service is terminated.
         """
         self.name = "lambda"
         self.lambda_host = os.getenv('LAMBDA_URL')
         self.terminated = False
         self.runs = runs
+        self.wire = os.getenv('WIRE_FORMAT', 'binary')
+        self.invocations = []
+        self.keep_warm = keep_warm
+        self.keep_warm_invocations = []
+        self.cold_starts = 0
+        self.last_call = time.time()
+        self._stop_keep_warm = threading.Event()
         self._scale()
+        if keep_warm:
+            threading.Thread(target=self._keep_warm, daemon=True).start()
 
     @property
     def get_warmup_cost(self) -> dict:
         """
         Returns the time and cost of warmup for the Lambda function.
-        Unlike EC2 intermediary lambda, we specify the number of 
-        instances as the cost formula accounts for that.
-        """
-        return CostCalculator.lambda_cost(self.warmup_time, self.runs)
+        Unlike EC2 intermediary lambda, each of the parallel calls made
+        to scale the function is billed on its own duration. The pings
+        keeping the containers warm since are included, and broken down
+        along with the cold starts they met under keep_warm.
+        """
+        warmup = CostCalculator.lambda_invocations_cost(self.warmup_invocations)
+        pings = CostCalculator.lambda_invocations_cost(self.keep_warm_invocations)
+        return {
+            "billable_time": warmup["billable_time"] + pings["billable_time"],
+            "cost": warmup["cost"] + pings["cost"],
+            "keep_warm": {
+                **pings,
+                "interval": self.keep_warm,
+                "pings": len(self.keep_warm_invocations),
+                "cold_starts": self.cold_starts,
+            },
+        }
     
     @property
     def get_endpoints(self) -> dict:
@@ -244,22 +460,48 @@ class Lambda(Service):
         """
         return self._format_callstrings(self.lambda_host)
 
-    def get_var9599(self, mean: float, std: float, shots: int) -> tuple:
+    def get_var9599(self, mean: float, std: float, shots: int, sampling: str='pseudo') -> tuple:
         """
         Performs parallel requests to the Lambda service intended for computations.
         The number of parallel requests is the scale specified by the user. Lambda 
         scales automatically by creating new instances of the function.
         """
         with ThreadPoolExecutor() as executor:
-            results = executor.map(lambda _: self._simulation(mean, std, shots), range(self.runs))
+            results = list(executor.map(lambda _: self._simulation(mean, std, shots, sampling), range(self.runs)))
+        if any(result is None for result in results):
+            raise SimulationError(f"{results.count(None)} of {len(results)} simulation calls got no results")
         var95, var99 = zip(*results)
         return var95, var99
+
+    def get_var9599_batch(self, means: np.ndarray, stds: np.ndarray, shots: int,
+                          sampling: str='pseudo') -> tuple:
+        """
+        Performs the simulations of many means and standard deviations in a
+        few requests. Every batch is sent as many times in parallel as the
+        scale specified, and the risks are returned as arrays with one row
+        per run and one column per simulation.
+        """
+        batches = self._batches(means, stds, shots)
+        calls = [batch for batch in batches for _ in range(self.runs)]
+        with ThreadPoolExecutor() as executor:
+            results = list(executor.map(lambda call: self._simulation(*call, shots, sampling), calls))
+        return self._gather_batches(results, self.runs, len(means))
+
+    def bill_analysis(self, time_taken: float) -> dict:
+        """
+        Lambda only bills the time spent in each invocation, rounded up to
+        the billing granularity, so the durations recorded for every call
+        of the analysis are billed rather than its wall-clock time.
+        """
+        return CostCalculator.lambda_invocations_cost(self.invocations)
     
     def terminate(self) -> None:
         """
-        Lambda infrastructure is handled by AWS.
+        Lambda infrastructure is handled by AWS, only the pings keeping
+        the containers warm are stopped.
         """
         self.terminated = True
+        self._stop_keep_warm.set()
 
     def check_scaled_ready(self) -> bool:
         """
@@ -286,23 +528,64 @@ class Lambda(Service):
         start = time.time()
         self.get_var9599(mean=0, std=0, shots=1)
         self.warmup_time = time.time() - start
+        self.warmup_invocations = self.invocations
+        self.reset_invocations()
+
+    def _keep_warm(self) -> None:
+        """
+        Pings the function whenever it was left idle for the keep_warm
+        interval. Containers idle for too long are reclaimed by AWS, the
+        pings are short and only sent when no analysis kept them busy.
+        """
+        while not self._stop_keep_warm.wait(max(self.last_call + self.keep_warm - time.time(), 0)):
+            if time.time() - self.last_call >= self.keep_warm:
+                self._ping()
+
+    def _ping(self) -> None:
+        """
+        Sends as many concurrent pings as the scale. Each holds its call for
+        KEEP_WARM_HOLD_MS so that they overlap and land on separate
+        containers, the pings then keep all of them warm.
+        """
+        with ThreadPoolExecutor(max_workers=self.runs) as executor:
+            results = list(executor.map(lambda _: self._ping_container(), range(self.runs)))
+        for duration, cold in filter(None, results):
+            self.keep_warm_invocations.append(duration)
+            self.cold_starts += cold
+        self.last_call = time.time()
+
+    def _ping_container(self) -> tuple | None:
+        """
+        Pings the function, returning the duration billed for the ping and
+        whether it met a cold container.
+        """
+        try:
+            start = time.time()
+            client = connect(self.lambda_host)
+            payload = json.dumps({"ping": True, "hold_ms": self.KEEP_WARM_HOLD_MS})
+            client.request("POST", "/default/function_one", payload, {"Content-Type": "application/json"})
+            data = json.loads(client.getresponse().read().decode('utf-8'))
+            reported = self._reported_duration(data.get('init_ms'), data.get('handler_ms'))
+            return time.time() - start if reported is None else reported, bool(data.get('cold'))
+        except IOError:
+            print(f'Couldn\'t connect to {self.lambda_host}')
     
-    def _simulation(self, mean: float, std: float, shots: int) -> tuple:
+    def _simulation(self, mean: float, std: float, shots: int, sampling: str) -> tuple:
         """
-        Computes the risks by taking the mean, standard deviation, and the 
-        number of shots. The request is sent to the Lambda function.
+        Computes the risks by taking the mean, standard deviation, the number
+        of shots and the sampling strategy of the shots. The request is sent
+        to the Lambda function. The call is billed on the duration the
+        function reports, the round trip to it is only used when it doesn't.
         """
         try:
-            client = http.client.HTTPSConnection(self.lambda_host)
-            payload = json.dumps({
-                "mean": mean,
-                "std": std,
-                "shots": shots,
-            })
-            client.request("POST", "/default/function_one", payload)
-            response = client.getresponse()
-            data = json.loads(response.read().decode('utf-8'))
-            return data['var95'], data['var99']
+            start = time.time()
+            client = connect(self.lambda_host)
+            var95, var99, reported = self._post_simulation(
+                client, "/default/function_one", mean, std, shots, sampling
+            )
+            self.invocations.append(time.time() - start if reported is None else reported)
+            self.last_call = time.time()
+            return var95, var99
         except IOError:
             print(f'Couldn\'t connect to {self.lambda_host}') 
 
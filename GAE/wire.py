@@ -0,0 +1,39 @@
+"""
+Binary wire format of the simulations, negotiated with the workers through
+the Content-Type of the requests. A request packs, little-endian, the number
+of shots (uint32), the number of simulations n (uint32) and the index of the
+sampling strategy (uint8), followed by the n means and the n standard
+deviations as float64. The response holds the n var95 followed by the n
+var99 as float64, which are read straight from the response body.
+"""
+import struct
+import numpy as np
+
+CONTENT_TYPE = "application/x-var9599"
+SAMPLING = ("pseudo", "antithetic", "sobol", "stratified")
+HEADER = struct.Struct("<IIB")
+FLOAT64 = np.dtype("<f8")
+
+
+def encode_request(mean: float | list | np.ndarray, std: float | list | np.ndarray,
+                   shots: int, sampling: str) -> bytes:
+    means = np.atleast_1d(np.asarray(mean, dtype=FLOAT64))
+    stds = np.atleast_1d(np.asarray(std, dtype=FLOAT64))
+    header = HEADER.pack(int(shots), len(means), SAMPLING.index(sampling))
+    return header + means.tobytes() + stds.tobytes()
+
+
+def is_response(body: bytes, count: int) -> bool:
+    """
+    Whether the body holds the var95 and var99 of the count simulations sent.
+    """
+    return len(body) == 2 * FLOAT64.itemsize * count
+
+
+def decode_response(body: bytes) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The arrays returned are views of the body, no values are copied.
+    """
+    values = np.frombuffer(body, dtype=FLOAT64)
+    count = len(values) // 2
+    return values[:count], values[count:]
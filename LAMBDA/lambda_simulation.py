@@ -1,22 +1,190 @@
+import sys
 import json
 import time
+import base64
 import random
+import struct
 
-start = time.time()
+from array import array
+from statistics import NormalDist
+
+# everything below runs once per container, on its cold start, and is reused
+# by every invocation the container serves afterwards
+INIT_START = time.perf_counter()
+STANDARD_NORMAL = NormalDist()
+RANDOM = random.Random()
+CONTENT_TYPE = 'application/x-var9599'
+SAMPLING = ('pseudo', 'antithetic', 'sobol', 'stratified')
+HEADER = struct.Struct('<IIB')
+SOBOL_POINTS = array('d')
+SOBOL_PRECOMPUTED = 10000
+cold = True
 
 
 def lambda_handler(event, context):
-    mean = float(event['mean'])
-    std = float(event['std'])
+    start = time.perf_counter()
+    # requests through a proxy integration carry their raw headers and body
+    if 'body' in event:
+        return proxy_handler(event, start)
+    return {**handle(event), **timings(start)}
+
+
+def handle(event: dict) -> dict:
+    """
+    Pings hold the call for hold_ms so that concurrent pings are served by
+    as many containers, which keeps them warm. Any other event is a
+    simulation, or a batch of them sent as lists of means and stds.
+    """
+    if event.get('ping'):
+        time.sleep(float(event.get('hold_ms', 0)) / 1000)
+        return {'warm': True}
+
     shots = int(event['shots'])
+    sampling = event.get('sampling', 'pseudo')
     
-    simulated = [random.gauss(mean,std) for x in range(shots)]
-    simulated.sort(reverse=True)
-    var95 = simulated[int(len(simulated)*0.95)]
-    var99 = simulated[int(len(simulated)*0.99)]
+    if isinstance(event['mean'], list):
+        var95, var99 = simulate_batch(event['mean'], event['std'], shots, sampling)
+    else:
+        var95, var99 = simulate(float(event['mean']), float(event['std']), shots, sampling)
     
     var = {
         'var95': var95,
         'var99': var99,
     }
-    return var
\ No newline at end of file
+    return var
+
+
+def timings(start: float) -> dict:
+    """
+    Durations of the container init, reported on its first invocation only,
+    and of the invocation, so that GAE bills what the container did rather
+    than the round trip to it.
+    """
+    global cold
+    was_cold, cold = cold, False
+    return {
+        'cold': was_cold,
+        'init_ms': INIT_MS if was_cold else 0.0,
+        'handler_ms': (time.perf_counter() - start) * 1000,
+    }
+
+
+def proxy_handler(event: dict, start: float) -> dict:
+    """
+    Simulations packed in the binary wire format are answered in it, with
+    the timings in headers, any other body is handled as the JSON event
+    of a direct integration.
+    """
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    body = event['body'] or ''
+    body = base64.b64decode(body) if event.get('isBase64Encoded') else body.encode('utf-8')
+    if headers.get('content-type', '').startswith(CONTENT_TYPE):
+        means, stds, shots, sampling = decode_request(body)
+        var95, var99 = simulate_batch(means, stds, shots, sampling)
+        body = base64.b64encode(encode_response(var95, var99)).decode('ascii')
+        timing = timings(start)
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': CONTENT_TYPE,
+                'X-Cold': str(timing['cold']).lower(),
+                'X-Init-Ms': str(timing['init_ms']),
+                'X-Handler-Ms': str(timing['handler_ms']),
+            },
+            'body': body,
+            'isBase64Encoded': True,
+        }
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({**handle(json.loads(body)), **timings(start)}),
+    }
+
+
+def simulate(mean: float, std: float, shots: int, sampling: str='pseudo') -> tuple:
+    simulated = draw(mean, std, shots, sampling)
+    simulated.sort(reverse=True)
+    var95 = simulated[int(len(simulated)*0.95)]
+    var99 = simulated[int(len(simulated)*0.99)]
+    return var95, var99
+
+
+def draw(mean: float, std: float, shots: int, sampling: str='pseudo') -> list:
+    """
+    Draws normal shots with the sampling strategy requested. Antithetic
+    variates pair every draw with its mirror, sobol uses the first Sobol
+    dimension (the base 2 van der Corput sequence) randomly shifted, and
+    stratified draws one uniform in each of the shots equal strata. The
+    last two are mapped to normals through the inverse normal cdf.
+    """
+    gauss, uniform = RANDOM.gauss, RANDOM.random
+    if sampling == 'antithetic':
+        half = [gauss(0, 1) for x in range((shots + 1) // 2)]
+        normals = (half + [-z for z in half])[:shots]
+    elif sampling == 'sobol':
+        shift = uniform()
+        normals = [inverse_normal((point + shift) % 1) for point in sobol_points(shots)]
+    elif sampling == 'stratified':
+        normals = [inverse_normal((x + uniform()) / shots) for x in range(shots)]
+    else:
+        return [gauss(mean, std) for x in range(shots)]
+    return [mean + std * z for z in normals]
+
+
+def sobol_points(shots: int) -> array:
+    """
+    The first shots points of the van der Corput sequence. They are the same
+    for every simulation, so they are computed once per container and only
+    extended when more shots than ever before are requested.
+    """
+    if len(SOBOL_POINTS) < shots:
+        SOBOL_POINTS.extend(van_der_corput(n + 1) for n in range(len(SOBOL_POINTS), shots))
+    return SOBOL_POINTS[:shots]
+
+
+def van_der_corput(n: int) -> float:
+    # base 2 radical inverse, the bits of n mirrored around the binary point
+    return int(format(n, '032b')[::-1], 2) / 2 ** 32
+
+
+def inverse_normal(u: float) -> float:
+    # uniforms of exactly 0 or 1 have no finite normal
+    return STANDARD_NORMAL.inv_cdf(min(max(u, 1e-12), 1 - 1e-12))
+
+
+def simulate_batch(means: list, stds: list, shots: int, sampling: str='pseudo') -> tuple:
+    results = [
+        simulate(float(mean), float(std), shots, sampling) 
+        for mean, std in zip(means, stds)
+    ]
+    var95 = [result[0] for result in results]
+    var99 = [result[1] for result in results]
+    return var95, var99
+
+
+def decode_request(body: bytes) -> tuple:
+    """
+    Binary requests pack, little-endian, the number of shots (uint32), the
+    number of simulations n (uint32) and the index of the sampling strategy
+    (uint8), followed by the n means and the n stds as float64.
+    """
+    shots, count, sampling = HEADER.unpack_from(body)
+    values = array('d')
+    values.frombytes(body[HEADER.size:])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values[:count], values[count:], shots, SAMPLING[sampling]
+
+
+def encode_response(var95: list, var99: list) -> bytes:
+    """
+    Binary responses hold the n var95 followed by the n var99 as float64.
+    """
+    values = array('d', var95 + var99)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+sobol_points(SOBOL_PRECOMPUTED)
+INIT_MS = (time.perf_counter() - INIT_START) * 1000
@@ -18,13 +18,16 @@ def lambda_handler(event, context):
         av99 = event["av99"]
         time = event["time"]
         cost = event["cost"]
-        return write_s3(s, r, h, d, t, p, profit_loss, av95, av99, time, cost)
+        latency = event.get("latency")
+        signals = event.get("signals")
+        return write_s3(s, r, h, d, t, p, profit_loss, av95, av99, time, cost, latency, signals)
     elif event["action"] == "read":
         return read_s3()
 
 
 def write_s3(s: str, r: int, h: int, d: int, t: str, p: int, 
-             profit_loss: float, av95: float, av99: float, time: float, cost: float) -> dict:
+             profit_loss: float, av95: float, av99: float, time: float, cost: float,
+             latency: float | None=None, signals: int | None=None) -> dict:
     """
     Writes results of an analysis into our S3 bucket.
     """
@@ -46,6 +49,8 @@ def write_s3(s: str, r: int, h: int, d: int, t: str, p: int,
             "av99": av99,
             "time": time,
             "cost": cost,
+            "latency": latency,
+            "signals": signals,
         }        
     )
     updated_audit = json.dumps(last_audit)
@@ -0,0 +1,140 @@
+"""
+Load test of the EC2 simulation server. The worker app runs under gunicorn
+with its configuration for each number of cores given, pinned to that many
+CPUs, and is sent simulations from many concurrent clients, pinned to the
+other CPUs when there are any, for a fixed duration. Requests per second,
+turned away requests (503) and latency percentiles are reported.
+
+    python benchmarks/bench_ec2_load.py --cores 1 2 4 --shots 10000
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import http.client
+
+from concurrent.futures import ThreadPoolExecutor
+
+import report
+from stubs import ROOT
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    cpus = len(os.sched_getaffinity(0))
+    parser.add_argument("--cores", nargs="+", type=int,
+                        default=sorted({1, max(cpus // 2, 1), cpus}))
+    parser.add_argument("--shots", type=int, default=10000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    return parser.parse_args()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(cpus: set, port: int) -> subprocess.Popen:
+    """
+    Starts gunicorn pinned to the CPUs given, its workers and their pools of
+    processes inherit the pinning.
+    """
+    env = {**os.environ, "SIM_PROCESSES": str(len(cpus)), "BIND": f"127.0.0.1:{port}"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=ROOT / "EC2", env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        preexec_fn=lambda: os.sched_setaffinity(0, cpus),
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            client = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            client.request("GET", "/health")
+            if client.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise TimeoutError("gunicorn didn't start")
+
+
+def client_loop(port: int, shots: int, until: float) -> tuple:
+    latencies, busy = [], 0
+    client = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    payload = json.dumps({"mean": 0.001, "std": 0.02, "shots": shots})
+    headers = {"Content-Type": "application/json"}
+    while time.monotonic() < until:
+        start = time.monotonic()
+        client.request("POST", "/calculate_var9599", payload, headers)
+        response = client.getresponse()
+        response.read()
+        if response.status == 503:
+            busy += 1
+            time.sleep(0.01)
+        else:
+            latencies.append(time.monotonic() - start)
+    return latencies, busy
+
+
+def main() -> int:
+    args = parse_args()
+    available = sorted(os.sched_getaffinity(0))
+    cases = []
+    for cores in args.cores:
+        if cores > len(available):
+            print(f"cores={cores:<3} skipped, only {len(available)} CPUs available")
+            continue
+        server_cpus = set(available[:cores])
+        os.sched_setaffinity(0, set(available[cores:]) or set(available))
+        port = free_port()
+        server = start_server(server_cpus, port)
+        try:
+            until = time.monotonic() + args.duration
+            with ThreadPoolExecutor(args.clients) as executor:
+                results = list(executor.map(
+                    lambda _: client_loop(port, args.shots, until), range(args.clients)
+                ))
+        finally:
+            server.terminate()
+            server.wait()
+            os.sched_setaffinity(0, set(available))
+        latencies = sorted(latency for result in results for latency in result[0])
+        busy = sum(result[1] for result in results)
+        case = {
+            "cores": cores,
+            "shots": args.shots,
+            "requests_per_s": len(latencies) / args.duration,
+            "busy_per_s": busy / args.duration,
+            "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+            "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+        }
+        cases.append(case)
+        print(
+            f"cores={cores:<3} {case['requests_per_s']:8.1f} req/s {case['busy_per_s']:8.1f} 503/s "
+            f"p50={case['p50_ms']:8.1f}ms p99={case['p99_ms']:8.1f}ms"
+        )
+
+    path = report.save("ec2_load", cases, vars(args), args.output)
+    print(f"results saved to {path}")
+    if args.compare:
+        regressions = report.compare(
+            cases, args.compare, keys=("cores", "shots"), metrics=("p50_ms", "p99_ms"),
+            threshold=args.threshold,
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
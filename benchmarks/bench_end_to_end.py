@@ -0,0 +1,135 @@
+"""
+End-to-end benchmark of /warmup -> /analyse -> /get_audit. The GAE app runs
+in process against local stand-ins of the Lambda functions, EC2 instances
+and S3 audit, with injectable latency and jitter, over synthetic prices
+holding the number of signals requested. Every combination of service,
+r, d, h and signals is measured and saved for regression comparison.
+
+    python benchmarks/bench_end_to_end.py --r 1 4 --d 1000 10000 \
+        --compare benchmarks/results/baseline.json
+"""
+import os
+import sys
+import time
+import argparse
+import itertools
+import statistics
+import tempfile
+
+from pathlib import Path
+
+import report
+from stubs import ROOT, Delay, LambdaStandIn, synthetic_prices
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--services", nargs="+", default=["lambda", "ec2"])
+    parser.add_argument("--r", nargs="+", type=int, default=[1, 3])
+    parser.add_argument("--d", nargs="+", type=int, default=[1000, 10000])
+    parser.add_argument("--h", nargs="+", type=int, default=[101])
+    parser.add_argument("--signals", nargs="+", type=int, default=[10, 50])
+    parser.add_argument("--t", default="sell")
+    parser.add_argument("--p", type=int, default=7)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    return parser.parse_args()
+
+
+def wait_for(client, route: str, key: str, timeout: float=60) -> None:
+    deadline = time.perf_counter() + timeout
+    while client.get(route).json[key] != "true":
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"{route} not {key} after {timeout}s")
+        time.sleep(0.01)
+
+
+def run_case(client, service: str, r: int, d: int, h: int, t: str, p: int) -> dict:
+    """
+    Goes through one full analysis as a user would, timing each phase.
+    """
+    start = time.perf_counter()
+    client.post("/warmup", json={"s": service, "r": str(r)})
+    wait_for(client, "/scaled_ready", "warm")
+    warmup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    client.post("/analyse", json={"h": str(h), "d": str(d), "t": t, "p": str(p)})
+    analyse = time.perf_counter() - start
+
+    start = time.perf_counter()
+    client.get("/get_audit")
+    audit = time.perf_counter() - start
+
+    signals = len(client.get("/get_sig_vars9599").json["var95"])
+    client.get("/terminate")
+    wait_for(client, "/scaled_terminated", "terminated")
+    return {"warmup": warmup, "analyse": analyse, "audit": audit, "signals": signals}
+
+
+def main() -> int:
+    args = parse_args()
+    stand_in = LambdaStandIn(Delay(args.latency_ms, args.jitter_ms))
+    prices = Path(tempfile.mkdtemp()) / "prices.csv"
+    synthetic_prices(max(args.signals), warmup=max(args.h)).to_csv(prices)
+    os.environ.update({
+        "LAMBDA_URL": stand_in.host,
+        "EC2_URL": stand_in.host,
+        "S3_URL": stand_in.host,
+        "GAE_URL": "http://localhost",
+        "PRICES_CSV": str(prices),
+    })
+    sys.path.insert(0, str(ROOT / "GAE"))
+    import analysis
+    from app import app
+
+    client = app.test_client()
+    cases = []
+    try:
+        for signals in args.signals:
+            analysis.data = synthetic_prices(signals, warmup=max(args.h))
+            for service, r, d, h in itertools.product(args.services, args.r, args.d, args.h):
+                runs = [
+                    run_case(client, service, r, d, h, args.t, args.p)
+                    for _ in range(args.repeat)
+                ]
+                analyse_s = statistics.median(run["analyse"] for run in runs)
+                case = {
+                    "service": service, "r": r, "d": d, "h": h, "signals": signals,
+                    "detected": runs[0]["signals"],
+                    "warmup_ms": statistics.median(run["warmup"] for run in runs) * 1000,
+                    "analyse_ms": analyse_s * 1000,
+                    "audit_ms": statistics.median(run["audit"] for run in runs) * 1000,
+                    "simulations_per_s": runs[0]["signals"] * r / analyse_s,
+                    "shots_per_s": runs[0]["signals"] * r * d / analyse_s,
+                }
+                cases.append(case)
+                print(
+                    f"{service:>6} r={r:<3} d={d:<7} h={h:<4} signals={signals:<5} "
+                    f"warmup={case['warmup_ms']:9.1f}ms analyse={case['analyse_ms']:9.1f}ms "
+                    f"audit={case['audit_ms']:7.1f}ms {case['simulations_per_s']:9.1f} sims/s"
+                )
+    finally:
+        stand_in.stop()
+
+    path = report.save("end_to_end", cases, vars(args), args.output)
+    print(f"results saved to {path}")
+    if args.compare:
+        regressions = report.compare(
+            cases, args.compare,
+            keys=("service", "r", "d", "h", "signals"),
+            metrics=("warmup_ms", "analyse_ms", "audit_ms"),
+            threshold=args.threshold,
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
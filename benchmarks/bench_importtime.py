@@ -0,0 +1,98 @@
+"""
+Import time benchmark of the GAE app, which an App Engine instance has to go
+through on a cold start before it answers. The app is imported in a fresh
+interpreter with -X importtime, the cumulative time of the import is checked
+against a budget and the modules whose loading is deferred to first use must
+not be imported at all.
+
+    python benchmarks/bench_importtime.py --budget-ms 500
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+import report
+from stubs import ROOT
+
+DEFERRED = ("pandas", "yfinance", "pandas_datareader")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--budget-ms", type=float, default=500)
+    parser.add_argument("--deferred", nargs="*", default=list(DEFERRED))
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    return parser.parse_args()
+
+
+def import_times(module: str) -> list[tuple]:
+    """
+    Imports the module in a fresh interpreter from the GAE directory and
+    returns (module, self us, cumulative us) for every module it imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT / "GAE", env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        capture_output=True, text=True, check=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        times.append((name.strip(), int(own), int(cumulative)))
+    return times
+
+
+def main() -> int:
+    args = parse_args()
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    totals = [
+        next(cumulative for name, _, cumulative in times if name == args.module)
+        for times in runs
+    ]
+    run = runs[totals.index(sorted(totals)[len(totals) // 2])]
+    imported = {name for name, _, _ in run}
+    deferred = [
+        name for name in args.deferred
+        if name in imported or any(module.startswith(name + ".") for module in imported)
+    ]
+
+    case = {
+        "module": args.module,
+        "import_ms": statistics.median(totals) / 1000,
+        "modules": len(run),
+        "deferred_imported": deferred,
+    }
+    print(f"import {args.module}: {case['import_ms']:.1f}ms over {case['modules']} modules "
+          f"(budget {args.budget_ms:.0f}ms)")
+    print("\nslowest modules of the median run:")
+    for name, own, cumulative in sorted(run, key=lambda time: time[1], reverse=True)[:args.top]:
+        print(f"{name:<40} self={own / 1000:8.1f}ms cumulative={cumulative / 1000:8.1f}ms")
+
+    path = report.save("importtime", [case], vars(args), args.output)
+    print(f"results saved to {path}")
+    failures = []
+    if case["import_ms"] > args.budget_ms:
+        failures.append(f"import took {case['import_ms']:.1f}ms, over the {args.budget_ms:.0f}ms budget")
+    if deferred:
+        failures.append(f"deferred modules imported: {', '.join(deferred)}")
+    if args.compare:
+        failures += report.compare(
+            [case], args.compare, keys=("module",), metrics=("import_ms",),
+            threshold=args.threshold,
+        )
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Benchmark of the local historical and bootstrap VaR engines against the Monte
+Carlo simulations of the services. Prices are drawn with Laplace returns, fat
+tailed and of known quantiles, so that the Three Soldiers and Three Crows
+patterns fire by chance on thousands of signals. Every engine analyses them
+through /analyse and is measured on its latency and on the error of its
+var95/var99 against the exact quantiles of the returns.
+
+    python benchmarks/bench_local_var.py --bars 25000 --d 10000
+"""
+import os
+import sys
+import math
+import time
+import argparse
+
+import numpy as np
+
+import report
+from stubs import ROOT, Delay, LambdaStandIn
+
+ENGINES = ("lambda", "ec2", "historical", "bootstrap")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES))
+    parser.add_argument("--bars", type=int, default=25000)
+    parser.add_argument("--std", type=float, default=0.02)
+    parser.add_argument("--r", type=int, default=1)
+    parser.add_argument("--d", type=int, default=10000)
+    parser.add_argument("--h", type=int, default=101)
+    parser.add_argument("--t", default="sell")
+    parser.add_argument("--p", type=int, default=7)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--jitter-ms", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    return parser.parse_args()
+
+
+def laplace_prices(bars: int, std: float, seed: int):
+    """
+    Prices whose daily returns are Laplace of the standard deviation given,
+    each bar opening at the previous close. Returns a frame shaped like the
+    Yahoo data.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    returns = rng.laplace(0, std / math.sqrt(2), bars)
+    closes = 100 * np.cumprod(1 + returns)
+    opens = np.concatenate(([100.0], closes[:-1]))
+    return pd.DataFrame({
+        "Open": opens,
+        "High": np.maximum(opens, closes) * 1.001,
+        "Low": np.minimum(opens, closes) * 0.999,
+        "Close": closes,
+        "Adj Close": closes,
+        "Volume": 1_000_000,
+    }, index=pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=bars))
+
+
+def laplace_quantile(q: float, std: float) -> float:
+    # quantiles of the lower tail of a centred Laplace distribution
+    return std / math.sqrt(2) * math.log(2 * q)
+
+
+def main() -> int:
+    args = parse_args()
+    stand_in = LambdaStandIn(Delay(args.latency_ms, args.jitter_ms))
+    os.environ.update({
+        "LAMBDA_URL": stand_in.host,
+        "EC2_URL": stand_in.host,
+        "S3_URL": stand_in.host,
+        "GAE_URL": "http://localhost",
+    })
+    sys.path.insert(0, str(ROOT / "GAE"))
+    import analysis
+    from app import app
+
+    analysis.data = laplace_prices(args.bars, args.std, args.seed)
+    exact95 = laplace_quantile(0.05, args.std)
+    exact99 = laplace_quantile(0.01, args.std)
+    client = app.test_client()
+    cases = []
+    try:
+        for engine in args.engines:
+            service = engine if engine in ("lambda", "ec2") else "lambda"
+            client.post("/warmup", json={"s": service, "r": str(args.r)})
+            deadline = time.perf_counter() + 60
+            while client.get("/scaled_ready").json["warm"] != "true":
+                if time.perf_counter() > deadline:
+                    raise TimeoutError(f"{service} not warm after 60s")
+                time.sleep(0.01)
+
+            start = time.perf_counter()
+            client.post("/analyse", json={
+                "h": str(args.h), "d": str(args.d), "t": args.t, "p": str(args.p),
+                "engine": engine if engine not in ("lambda", "ec2") else "service",
+            })
+            analyse = time.perf_counter() - start
+
+            risks = client.get("/get_sig_vars9599").json
+            var95, var99 = np.array(risks["var95"]), np.array(risks["var99"])
+            case = {
+                "engine": engine,
+                "signals": len(var95),
+                "analyse_ms": analyse * 1000,
+                "signals_per_s": len(var95) / analyse,
+                "rmse_var95": float(np.sqrt(np.mean((var95 - exact95) ** 2))),
+                "rmse_var99": float(np.sqrt(np.mean((var99 - exact99) ** 2))),
+                "bias_var99": float(np.mean(var99 - exact99)),
+                "cost": client.get("/get_time_cost").json["cost"],
+            }
+            cases.append(case)
+            print(
+                f"{engine:>10} signals={case['signals']:<6} analyse={case['analyse_ms']:10.1f}ms "
+                f"rmse var95={case['rmse_var95']:.5f} var99={case['rmse_var99']:.5f} "
+                f"bias var99={case['bias_var99']:+.5f} cost={case['cost']:.8f}"
+            )
+            client.get("/terminate")
+    finally:
+        stand_in.stop()
+
+    path = report.save("local_var", cases, {**vars(args), "exact_var95": exact95, "exact_var99": exact99},
+                       args.output)
+    print(f"results saved to {path}")
+    if args.compare:
+        regressions = report.compare(
+            cases, args.compare, keys=("engine",),
+            metrics=("analyse_ms", "rmse_var95", "rmse_var99"),
+            threshold=args.threshold,
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Convergence benchmark of the sampling strategies of the VaR simulation.
+The Lambda worker simulates a normal of known quantiles over and over for
+growing numbers of shots, and the root mean squared error of var95/var99
+gives, for each strategy, the shots needed to reach the target error and
+the share of the pseudo-random compute that it represents.
+
+    python benchmarks/bench_sampling.py --target 0.0005
+"""
+import sys
+import math
+import time
+import argparse
+
+from statistics import NormalDist
+
+import report
+from stubs import ROOT, load_module
+
+STRATEGIES = ("pseudo", "antithetic", "sobol", "stratified")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES))
+    parser.add_argument("--shots", nargs="+", type=int,
+                        default=[250, 500, 1000, 2000, 4000, 8000, 16000, 32000])
+    parser.add_argument("--mean", type=float, default=0.001)
+    parser.add_argument("--std", type=float, default=0.02)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--target", type=float, default=0.0005)
+    parser.add_argument("--output")
+    return parser.parse_args()
+
+
+def exact_var9599(mean: float, std: float, shots: int) -> tuple:
+    """
+    Quantiles picked by the workers out of the shots sorted in decreasing
+    order, for an infinitely precise sample of the same size.
+    """
+    normal = NormalDist(mean, std)
+    return (
+        normal.inv_cdf(1 - (int(shots * 0.95) + 0.5) / shots),
+        normal.inv_cdf(1 - (int(shots * 0.99) + 0.5) / shots),
+    )
+
+
+def main() -> int:
+    args = parse_args()
+    worker = load_module("lambda_simulation", ROOT / "LAMBDA" / "lambda_simulation.py")
+    cases = []
+    for sampling in args.strategies:
+        for shots in args.shots:
+            exact95, exact99 = exact_var9599(args.mean, args.std, shots)
+            errors95, errors99 = 0.0, 0.0
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                var95, var99 = worker.simulate(args.mean, args.std, shots, sampling)
+                errors95 += (var95 - exact95) ** 2
+                errors99 += (var99 - exact99) ** 2
+            elapsed = time.perf_counter() - start
+            case = {
+                "sampling": sampling,
+                "shots": shots,
+                "rmse_var95": math.sqrt(errors95 / args.repeat),
+                "rmse_var99": math.sqrt(errors99 / args.repeat),
+                "simulation_ms": elapsed / args.repeat * 1000,
+            }
+            cases.append(case)
+            print(
+                f"{sampling:>10} shots={shots:<6} rmse var95={case['rmse_var95']:.6f} "
+                f"var99={case['rmse_var99']:.6f} {case['simulation_ms']:8.2f}ms"
+            )
+
+    print(f"\nshots to reach a var99 rmse of {args.target}:")
+    needed = {}
+    for sampling in args.strategies:
+        reached = [
+            case for case in cases
+            if case["sampling"] == sampling and case["rmse_var99"] <= args.target
+        ]
+        needed[sampling] = min((case["shots"] for case in reached), default=None)
+    for sampling, shots in needed.items():
+        if shots is None:
+            print(f"{sampling:>10} not reached within {max(args.shots)} shots")
+        elif needed.get("pseudo"):
+            print(f"{sampling:>10} {shots:<6} ({shots / needed['pseudo']:.0%} of pseudo-random shots)")
+        else:
+            print(f"{sampling:>10} {shots}")
+
+    path = report.save("sampling", cases, {**vars(args), "shots_to_target": needed}, args.output)
+    print(f"results saved to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
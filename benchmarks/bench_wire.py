@@ -0,0 +1,111 @@
+"""
+Wire format benchmark of the simulation requests and responses. For growing
+batches of simulations, JSON and the packed float64 format are compared on
+the bytes sent each way and on the time spent encoding and parsing them, on
+the GAE side (encode request, parse response into NumPy) and on the worker
+side (parse request, encode response).
+
+    python benchmarks/bench_wire.py --sizes 1 100 10000
+"""
+import sys
+import json
+import time
+import random
+import argparse
+
+import numpy as np
+
+import report
+from stubs import ROOT, load_module
+
+sys.path.insert(0, str(ROOT / "GAE"))
+import wire
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    return parser.parse_args()
+
+
+def timed(function, repeat: int) -> tuple:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat * 1e6
+
+
+def json_round_trip(means: np.ndarray, stds: np.ndarray, var95: list, var99: list,
+                    repeat: int) -> dict:
+    request, encode_us = timed(lambda: json.dumps({
+        "mean": means.tolist(), "std": stds.tolist(), "shots": 10000, "sampling": "pseudo",
+    }).encode("utf-8"), repeat)
+    _, worker_parse_us = timed(lambda: json.loads(request), repeat)
+    response, worker_encode_us = timed(
+        lambda: json.dumps({"var95": var95, "var99": var99}).encode("utf-8"), repeat
+    )
+
+    def parse():
+        data = json.loads(response)
+        return np.array(data["var95"]), np.array(data["var99"])
+
+    _, parse_us = timed(parse, repeat)
+    return {
+        "request_bytes": len(request), "response_bytes": len(response),
+        "gae_us": encode_us + parse_us, "worker_us": worker_parse_us + worker_encode_us,
+    }
+
+
+def binary_round_trip(worker, means: np.ndarray, stds: np.ndarray, var95: list, var99: list,
+                      repeat: int) -> dict:
+    request, encode_us = timed(lambda: wire.encode_request(means, stds, 10000, "pseudo"), repeat)
+    _, worker_parse_us = timed(lambda: worker.decode_request(request), repeat)
+    response, worker_encode_us = timed(lambda: worker.encode_response(var95, var99), repeat)
+    _, parse_us = timed(lambda: wire.decode_response(response), repeat)
+    return {
+        "request_bytes": len(request), "response_bytes": len(response),
+        "gae_us": encode_us + parse_us, "worker_us": worker_parse_us + worker_encode_us,
+    }
+
+
+def main() -> int:
+    args = parse_args()
+    worker = load_module("lambda_simulation", ROOT / "LAMBDA" / "lambda_simulation.py")
+    cases = []
+    for size in args.sizes:
+        means = np.array([random.gauss(0.001, 0.001) for _ in range(size)])
+        stds = np.array([random.uniform(0.01, 0.03) for _ in range(size)])
+        var95 = [random.gauss(-0.03, 0.01) for _ in range(size)]
+        var99 = [random.gauss(-0.05, 0.01) for _ in range(size)]
+        for name, measured in (
+            ("json", json_round_trip(means, stds, var95, var99, args.repeat)),
+            ("binary", binary_round_trip(worker, means, stds, var95, var99, args.repeat)),
+        ):
+            case = {"format": name, "size": size, **measured}
+            cases.append(case)
+            print(
+                f"{name:>6} n={size:<6} request={case['request_bytes']:>8}B "
+                f"response={case['response_bytes']:>8}B gae={case['gae_us']:10.1f}us "
+                f"worker={case['worker_us']:10.1f}us"
+            )
+
+    path = report.save("wire", cases, vars(args), args.output)
+    print(f"results saved to {path}")
+    if args.compare:
+        regressions = report.compare(
+            cases, args.compare, keys=("format", "size"),
+            metrics=("request_bytes", "response_bytes", "gae_us", "worker_us"),
+            threshold=args.threshold,
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
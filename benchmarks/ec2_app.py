@@ -0,0 +1,9 @@
+"""
+The EC2 worker app under a name of its own, since it shares its file name
+with the GAE app. The module is importable by name so that the processes of
+its pool, started from a fork server, can load the functions sent to them.
+"""
+from pathlib import Path
+
+_path = Path(__file__).resolve().parent.parent / "EC2" / "app.py"
+exec(compile(_path.read_text(), str(_path), "exec"))
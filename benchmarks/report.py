@@ -0,0 +1,55 @@
+import json
+import time
+import platform
+
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def save(name: str, cases: list[dict], parameters: dict, output: str | None=None) -> Path:
+    """
+    Saves the cases measured by a benchmark along with the parameters and
+    the machine it ran on, so that later runs can be compared against it.
+    """
+    path = Path(output) if output else RESULTS_DIR / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        "benchmark": name,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        },
+        "parameters": parameters,
+        "cases": cases,
+    }, indent=4))
+    return path
+
+
+def compare(cases: list[dict], baseline: str, keys: tuple, metrics: tuple,
+            threshold: float) -> list[str]:
+    """
+    Compares the metrics of the cases matching the baseline ones on their
+    keys. Metrics are costs (lower is better), a case regresses when one
+    grows by more than the threshold ratio. Returns the regressions found.
+    """
+    previous = {
+        tuple(case[key] for key in keys): case
+        for case in json.loads(Path(baseline).read_text())["cases"]
+    }
+    regressions = []
+    for case in cases:
+        base = previous.get(tuple(case[key] for key in keys))
+        if base is None:
+            continue
+        for metric in metrics:
+            if not base.get(metric):
+                continue
+            ratio = case[metric] / base[metric]
+            label = ", ".join(f"{key}={case[key]}" for key in keys)
+            print(f"{label}: {metric} {base[metric]:.3f} -> {case[metric]:.3f} ({ratio:.2f}x)")
+            if ratio > 1 + threshold:
+                regressions.append(f"{label}: {metric} regressed {ratio:.2f}x")
+    return regressions
@@ -0,0 +1,217 @@
+import sys
+import json
+import time
+import base64
+import random
+import threading
+import importlib.util
+
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_module(name: str, path: Path):
+    """
+    Loads a module from its path so that the workers of the different
+    deployments, which share file names, can be imported side by side.
+    """
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class Delay:
+    """
+    Network and platform latency injected in every request handled by a
+    stand-in, a fixed latency plus a uniformly drawn jitter (ms).
+    """
+    def __init__(self, latency_ms: float=0, jitter_ms: float=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def wait(self) -> None:
+        delay_ms = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class EC2StandIn:
+    """
+    Serves the actual EC2 worker app locally behind the injected delay,
+    mimicking one instance reachable through its dns.
+    """
+    def __init__(self, delay: Delay):
+        import ec2_app as worker
+
+        def delayed_app(environ, start_response):
+            delay.wait()
+            return worker.app(environ, start_response)
+
+        self.server = make_server(
+            "127.0.0.1", 0, delayed_app, threaded=True, request_handler=QuietRequestHandler
+        )
+        self.dns = f"127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+
+
+class LambdaStandIn:
+    """
+    Mimics the API gateway of the three Lambda functions. function_one runs
+    the actual simulation handler through a proxy integration, function_two launches and terminates
+    EC2 stand-ins and function_three keeps the audit in memory instead of
+    the S3 bucket.
+    """
+    def __init__(self, delay: Delay, ec2_delay: Delay | None=None):
+        self.delay = delay
+        self.ec2_delay = ec2_delay or delay
+        self.simulation = load_module(
+            "lambda_simulation", ROOT / "LAMBDA" / "lambda_simulation.py"
+        ).lambda_handler
+        self.instances = {}
+        self.audit = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.host = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        for instance in self.instances.values():
+            instance.stop()
+        self.server.shutdown()
+
+    def function_one(self, event: dict) -> dict:
+        return self.simulation(event, None)
+
+    def proxy_function_one(self, headers: dict, body: bytes) -> tuple:
+        """
+        function_one behind a proxy integration, which passes the raw request
+        to the handler so that the binary wire format can be negotiated.
+        """
+        response = self.simulation({
+            "headers": dict(headers),
+            "body": base64.b64encode(body).decode("ascii"),
+            "isBase64Encoded": True,
+        }, None)
+        body = response["body"]
+        if response.get("isBase64Encoded"):
+            return response["headers"], base64.b64decode(body)
+        return response["headers"], body.encode("utf-8")
+
+    def function_two(self, event: dict) -> dict:
+        action = event["action"].lower()
+        if action == "create":
+            with self.lock:
+                ids = []
+                for _ in range(int(event["r"])):
+                    instance_id = f"i-local{len(self.instances):04d}"
+                    self.instances[instance_id] = EC2StandIn(self.ec2_delay)
+                    ids.append(instance_id)
+            return {"instances_ids": ids}
+        elif action == "confirm_creation":
+            return {
+                "warm": True,
+                "instances_dns": [self.instances[i].dns for i in event["ids"]],
+            }
+        elif action == "terminate":
+            with self.lock:
+                for instance_id in event["ids"]:
+                    self.instances.pop(instance_id).stop()
+            return {"result": "ok"}
+        elif action == "confirm_termination":
+            return {"terminated": not any(i in self.instances for i in event["ids"])}
+
+    def function_three(self, event: dict) -> dict | list:
+        if event["action"] == "write":
+            with self.lock:
+                self.audit.append({k: v for k, v in event.items() if k != "action"})
+            return {"result": "ok"}
+        elif event["action"] == "read":
+            return self.audit
+
+    def _handler(self):
+        stand_in = self
+        functions = {
+            "/default/function_one": self.function_one,
+            "/default/function_two": self.function_two,
+            "/default/function_three": self.function_three,
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                stand_in.delay.wait()
+                length = int(self.headers.get("Content-Length", 0))
+                request = self.rfile.read(length)
+                function = functions.get(self.path)
+                if function is None:
+                    self.send_error(404)
+                    return
+                if function == stand_in.function_one:
+                    headers, body = stand_in.proxy_function_one(self.headers, request)
+                else:
+                    headers = {"Content-Type": "application/json"}
+                    body = json.dumps(function(json.loads(request or b"{}"))).encode("utf-8")
+                self.send_response(200)
+                for header, value in headers.items():
+                    self.send_header(header, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def synthetic_prices(signals: int, warmup: int=252, seed: int=0):
+    """
+    Builds OHLC bars where candles alternate direction, so that no pattern
+    fires by chance, and plants exactly as many Three Crows and Three
+    Soldiers as signals requested after the warmup bars needed by the
+    lookback. Returns a frame shaped like the Yahoo data.
+    """
+    import pandas as pd
+
+    rng = random.Random(seed)
+    directions = [1 if i % 2 else -1 for i in range(warmup)]
+    for n in range(2 * signals):
+        planted = -1 if n % 2 == 0 else 1
+        if directions[-1] == planted:
+            directions.append(-planted)
+        directions += [planted] * 3
+        for _ in range(rng.randint(1, 6)):
+            directions.append(-directions[-1])
+
+    opens, closes = [], []
+    close = 100.0
+    for direction in directions:
+        opens.append(close)
+        close = max(close + direction * rng.uniform(0.1, 1.0), 1.0)
+        closes.append(close)
+    index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=len(directions))
+    return pd.DataFrame({
+        "Open": opens,
+        "High": [max(o, c) + 0.05 for o, c in zip(opens, closes)],
+        "Low": [min(o, c) - 0.05 for o, c in zip(opens, closes)],
+        "Close": closes,
+        "Adj Close": closes,
+        "Volume": [1_000_000] * len(directions),
+    }, index=index)